@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# bench/bench_parse_prompt.py — per-request transcript parsing cost (20k-char prompts)
+#
+# Compares, for one /ask_me request:
+#  - legacy: extract_last_valid (two reverse passes) run 3x
+#            (chain_stream + build_stage1_user_text + build_profile_user_text)
+#  - now:    parse_prompt() once (single reverse pass, early stop), reused by every builder
+#
+# Usage:
+#   python bench/bench_parse_prompt.py [--chars 20000] [--repeat 200]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+from bench.corpus import make_transcript  # noqa: E402
+
+
+# =========================
+# 🧾 Legacy reference (pre-ParsedPrompt extract_last_valid)
+# =========================
+def legacy_extract_last_valid(raw: str):
+    raw = raw or ""
+
+    p_inline = server._parse_teams_inline(raw.strip())
+    if p_inline:
+        if server.FILTER_NOISE and server.is_noise_text(p_inline["text"]):
+            pass
+        elif server.is_code_like(p_inline["text"]):
+            pass
+        else:
+            return p_inline
+
+    lines_all = [ln.strip() for ln in raw.splitlines() if ln and ln.strip()]
+    lines = [ln for ln in lines_all if not server._is_ignored_line(ln)]
+
+    for ln in reversed(lines):
+        if server._INTERVIEWER_PREFIX_RE.match(ln):
+            p = server.parse_line_author_and_text(ln)
+            if p and not (server.FILTER_NOISE and server.is_noise_text(p["text"])) and not server.is_code_like(p["text"]):
+                return p
+
+    for ln in reversed(lines):
+        p = server.parse_line_author_and_text(ln)
+        if not p:
+            continue
+        if server.FILTER_NOISE and server.is_noise_text(p["text"]):
+            continue
+        if server.is_code_like(p["text"]):
+            continue
+        return p
+
+    return None
+
+
+def legacy_request(raw: str):
+    # what one chain request used to do: three full scans + per-builder code/canned checks
+    for _ in range(3):
+        last = legacy_extract_last_valid(raw)
+        speech = (last or {}).get("text") or raw.strip()
+        server.is_code_like(speech)
+    server._stage1_canned((last or {}).get("author") or "Interviewer", speech, "positivo")
+
+
+def new_request(raw: str):
+    server.parse_prompt(raw)
+
+
+def _time_per_call(fn, raw: str, repeat: int) -> float:
+    fn(raw)  # warm regex caches
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(raw)
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chars", type=int, default=server.MAX_PROMPT_CHARS)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    print(f"transcript_chars={args.chars} repeat={args.repeat}")
+    print(f"{'scenario':<20} {'legacy_us':>10} {'now_us':>10} {'saving':>8}")
+    for scenario in ("speaker_tail", "interviewer_last", "interviewer_early", "code_tail"):
+        raw = make_transcript(args.chars, scenario)
+        old = legacy_extract_last_valid(raw)
+        new = server.extract_last_valid(raw)
+        assert old == new, f"{scenario}: parser mismatch {old!r} != {new!r}"
+        t_old = _time_per_call(legacy_request, raw, args.repeat)
+        t_new = _time_per_call(new_request, raw, args.repeat)
+        print(f"{scenario:<20} {t_old:>10.1f} {t_new:>10.1f} {(1 - t_new / t_old) * 100:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# bench/bench_stage1_stream.py — stage-1 stop/echo handling cost per stream vs n_predict
+#
+# Compares the per-delta work in stream_and_collect_llama_api's _gen:
+#  - legacy: rebuild acc, strip_prompt_echo(acc) + find_stop_index(acc) on the whole text per delta
+#            and slice one[printed:]  -> O(n^2) per stream
+#  - now:    StreamStopMatcher.feed(delta) on the held-back tail only -> O(n)
+#
+# Usage:
+#   python bench/bench_stage1_stream.py [--sizes 256,1024,4096,16384] [--repeat 5]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+WORDS = "we used Anypoint MQ with retries, backoff and a DLQ for poison messages in the process layer".split()
+
+
+def make_deltas(n_tokens: int, seed: int = 3, split_stop: bool = False, echo: str = "") -> list:
+    # echo: "" (none), "whole" (header in one delta) or "split" (header token by token)
+    rnd = random.Random(seed)
+    out = []
+    if echo == "whole":
+        out += [server.ECHO_MARKER, "\n\n"]
+    elif echo == "split":
+        out += ["<|start_header_id|>", "assistant", "<|end_header_id|>", "\n\n"]
+    for i in range(n_tokens):
+        w = rnd.choice(WORDS)
+        out.append(w if i == 0 else (" " + w if rnd.random() > 0.05 else "\n" + w))
+    out += ["<|eo", "t_id|>"] if split_stop else ["<|eot_id|>"]
+    out.append(" trailing text after stop")
+    return out
+
+
+def legacy_stream(deltas) -> str:
+    acc = ""
+    printed = 0
+    parts = []
+    for txt in deltas:
+        if len(txt) >= len(acc) and txt.startswith(acc):
+            acc = txt
+        else:
+            acc += txt
+        one = server.strip_prompt_echo(acc.replace("\r", "").replace("\n", " ").strip())
+        cut = server.find_stop_index(one, server.STAGE1_STOP)
+        if cut >= 0:
+            one = one[:cut].strip()
+        if len(one) > printed:
+            parts.append(one[printed:].encode("utf-8", errors="ignore"))
+            printed = len(one)
+        if cut >= 0:
+            break
+    return b"".join(parts).decode("utf-8")
+
+
+def new_stream(deltas) -> str:
+    acc = ""
+    m = server.StreamStopMatcher(server.STAGE1_STOP)
+    parts = []
+    for txt in deltas:
+        if len(txt) >= len(acc) and txt.startswith(acc):
+            delta = txt[len(acc):]
+            acc = txt
+        else:
+            delta = txt
+            acc += txt
+        out = m.feed(delta)
+        if out:
+            parts.append(out.encode("utf-8", errors="ignore"))
+        if m.stopped:
+            break
+    tail = m.flush()
+    if tail:
+        parts.append(tail.encode("utf-8", errors="ignore"))
+    return b"".join(parts).decode("utf-8")
+
+
+def _best_ms(fn, deltas, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(deltas)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="256,1024,4096,16384")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    # same output as the legacy loop whenever markers arrive as whole tokens
+    for n in (1, 7, 300):
+        for echo in ("", "whole"):
+            d = make_deltas(n, echo=echo)
+            assert legacy_stream(d) == new_stream(d), f"mismatch n={n} echo={echo}"
+    # markers split across deltas: legacy leaks the first half, the matcher holds it back
+    d = make_deltas(50, split_stop=True)
+    assert "<|eo" in legacy_stream(d) and "<|eo" not in new_stream(d)
+    d = make_deltas(50, echo="split")
+    assert "<|start_header_id|>" in legacy_stream(d) and new_stream(d) == new_stream(make_deltas(50))
+
+    print(f"{'n_predict':>10} {'legacy_ms':>10} {'now_ms':>10} {'speedup':>8} {'now_us/tok':>11}")
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        d = make_deltas(n)
+        t_old = _best_ms(legacy_stream, d, args.repeat)
+        t_new = _best_ms(new_stream, d, args.repeat)
+        print(f"{n:>10} {t_old:>10.2f} {t_new:>10.2f} {t_old / t_new:>7.1f}x {t_new * 1000.0 / n:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
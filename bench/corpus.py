@@ -0,0 +1,151 @@
+# bench/corpus.py — deterministic transcript corpus for the parser/filter benchmarks
+#
+# Every generator takes (n_chars, seed) and returns the same text for the same arguments, so
+# timings are comparable across commits. Scenarios mirror what the extension actually sends:
+#  - teams_inline: one long "Teams • Speaker: msg Teams • ..." dump (no newlines)
+#  - meet:         "Speaker: msg" caption lines with speaker-less continuations
+#  - slack:        "[10:42] Speaker: msg" huddle captions
+#  - powershell:   terminal noise (PS prompts, npm/pip output, tracebacks) between captions
+#  - code:         pasted code blocks between captions
+#  - mixed:        all of the above interleaved
+
+import random
+
+SPEAKERS = ["Maria Silva", "John Carter", "Unknown", "Ana Souza", "Desconhecido"]
+SENTENCES = [
+    "Can you walk me through how you would design an API-led integration for order management?",
+    "We use Anypoint MQ for async flows and DataWeave for the mappings.",
+    "What was the hardest production incident you handled with Mule 4?",
+    "Sure, let me share my screen for a second.",
+    "How do you handle retries and idempotency on the process layer?",
+    "Você pode explicar como funciona o tratamento de erros no seu fluxo?",
+    "Obrigado, ficou bem claro. Próxima pergunta então.",
+]
+NOISE = ["OK", "HM", "AH", "PS C:\\Users\\dev> npm run build", "[stage1] preview", "Traceback (most recent call last):"]
+POWERSHELL = [
+    "PS C:\\Users\\dev\\repo> npm run build",
+    "PS C:\\Users\\dev\\repo> python server.py",
+    "> mt-proxy@1.0.0 build",
+    "npm WARN deprecated inflight@1.0.6: This module is not supported",
+    "Traceback (most recent call last):",
+    '  File "server.py", line 214, in <module>',
+    "During handling of the above exception, another exception occurred:",
+    "INFO:     Uvicorn running on http://0.0.0.0:8000 (Press CTRL+C to quit)",
+]
+CODE = [
+    "%dw 2.0 output application/json --- payload map (item) -> { id: item.id, total: item.price * item.qty }",
+    "const handler = async (event) => { return { statusCode: 200, body: JSON.stringify(event) }; };",
+    "def retry(fn, attempts=3):",
+    "    for i in range(attempts):",
+    "import { useEffect, useState } from 'react';",
+    "public class OrderService { private final OrderRepository repo; }",
+    "SELECT id, status FROM orders WHERE created_at > NOW() - INTERVAL '1 day';",
+]
+DRAFTS = [
+    "Sure. In my last project I designed the System APIs first, then Process APIs on top.\n\n```java\nclass X {}\n```",
+    "\x1b[32m[stage1]\x1b[0m I would start with idempotency keys on the process layer and a DLQ.",
+    "Traceback (most recent call last):\nI handled it by rolling back the deploy and adding a circuit breaker.",
+    "Yes — we used Anypoint MQ with retries, exponential backoff and an error queue for poison messages.  " * 6,
+]
+
+SCENARIOS = ("teams_inline", "meet", "slack", "powershell", "code", "mixed")
+
+
+def _caption(rnd: random.Random, style: str) -> str:
+    who, what = rnd.choice(SPEAKERS), rnd.choice(SENTENCES)
+    if style == "slack":
+        return f"[10:{rnd.randint(10, 59)}] {who}: {what}"
+    if style == "teams_lines":
+        return f"10:{rnd.randint(10, 59)}:{rnd.randint(10, 59)} : {who} : {what}"
+    return f"{who}: {what}"
+
+
+def _lines(n_chars: int, seed: int, pick) -> str:
+    rnd = random.Random(seed)
+    lines, total = [], 0
+    while total < n_chars:
+        ln = pick(rnd)
+        lines.append(ln)
+        total += len(ln) + 1
+    out = "\n".join(lines)
+    return out[: out.rfind("\n", 0, n_chars + 1)] if len(out) > n_chars else out
+
+
+def teams_inline(n_chars: int, seed: int = 7) -> str:
+    rnd = random.Random(seed)
+    parts, total = [], 0
+    while total < n_chars:
+        seg = f"Teams • {rnd.choice(SPEAKERS)}: {rnd.choice(SENTENCES)}"
+        parts.append(seg)
+        total += len(seg) + 1
+    return " ".join(parts)[:n_chars]
+
+
+def meet(n_chars: int, seed: int = 7) -> str:
+    return _lines(n_chars, seed, lambda r: _caption(r, "meet") if r.random() < 0.8 else r.choice(SENTENCES))
+
+
+def slack(n_chars: int, seed: int = 7) -> str:
+    return _lines(n_chars, seed, lambda r: _caption(r, "slack"))
+
+
+def powershell(n_chars: int, seed: int = 7) -> str:
+    return _lines(n_chars, seed, lambda r: r.choice(POWERSHELL) if r.random() < 0.5 else _caption(r, "teams_lines"))
+
+
+def code(n_chars: int, seed: int = 7) -> str:
+    return _lines(n_chars, seed, lambda r: f"{r.choice(SPEAKERS)}: {r.choice(CODE)}" if r.random() < 0.5 else _caption(r, "meet"))
+
+
+def mixed(n_chars: int, seed: int = 7) -> str:
+    def pick(r):
+        x = r.random()
+        if x < 0.15:
+            return r.choice(NOISE)
+        if x < 0.25:
+            return r.choice(POWERSHELL)
+        if x < 0.35:
+            return f"{r.choice(SPEAKERS)}: {r.choice(CODE)}"
+        if x < 0.40:
+            return f"Teams • {r.choice(SPEAKERS)}: {r.choice(SENTENCES)}"
+        return _caption(r, r.choice(("meet", "slack", "teams_lines")))
+
+    return _lines(n_chars, seed, pick)
+
+
+def transcript(scenario: str, n_chars: int, seed: int = 7) -> str:
+    return globals()[scenario](n_chars, seed)
+
+
+def sample_lines(n: int = 400, seed: int = 11) -> list:
+    # one-line inputs for the per-line helpers (author split, code/noise/lang checks)
+    return [ln for ln in mixed(n * 80, seed).splitlines() if ln.strip()][:n]
+
+
+def sample_drafts() -> list:
+    return list(DRAFTS)
+
+
+def make_transcript(n_chars: int, scenario: str, seed: int = 7) -> str:
+    # bench_parse_prompt scenarios: where the answerable line sits in a noisy caption log
+    rnd = random.Random(seed)
+    lines = []
+    total = 0
+    if scenario == "interviewer_early":
+        lines.append("Interviewer: Tell me about your MuleSoft certifications.")
+    while total < n_chars:
+        r = rnd.random()
+        if r < 0.15:
+            ln = rnd.choice(NOISE)
+        elif r < 0.25:
+            ln = f"{rnd.choice(SPEAKERS[:4])}: {rnd.choice(CODE[:2])}"
+        else:
+            ln = f"10:{rnd.randint(10, 59)}:{rnd.randint(10, 59)} : {rnd.choice(SPEAKERS[:4])} : {rnd.choice(SENTENCES[:5])}"
+        lines.append(ln)
+        total += len(ln) + 1
+    if scenario == "interviewer_last":
+        lines.append("Interviewer: How would you secure a System API with OAuth 2.0?")
+    if scenario == "code_tail":
+        lines.extend([f"Ana Souza: {c}" for c in CODE[:2]] * 20)
+    out = "\n".join(lines)
+    return out[: out.rfind("\n", 0, n_chars + 1)] if len(out) > n_chars else out
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# bench/load_test.py — concurrent load generator for server.py (end-to-end + per-stage latency)
+#
+# Drives /ask_me, /ask_me_neg, /ask, /ask_llama (and /ask_me_both) at a fixed concurrency and reports, per endpoint:
+#  - end-to-end latency p50/p95/p99 and client TTFB
+#  - stage-1 / stage-2 TTFT (from the server's [timings] trailer, report_timings=true)
+#  - throughput (req/s, KB/s) and error count
+#
+# Usage (self-contained: spawns bench/mock_upstreams.py + server.py on free ports):
+#   python bench/load_test.py --spawn --concurrency 16 --requests 400
+#   python bench/load_test.py --spawn --mock-args "--ttft-ms 300 --tps 40 --error-rate 0.02"
+# Against a running proxy:
+#   python bench/load_test.py --base http://127.0.0.1:8000 --duration 30 --endpoints /ask_me=3,/ask=1
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+QUESTIONS = [
+    "Can you walk me through your experience with Kafka?",
+    "How would you design an idempotent payment API?",
+    "What is the difference between a process and a thread?",
+    "Tell me about a production incident you handled.",
+    "How do you approach retries and backoff between services?",
+    "Why are you interested in this role?",
+    "How do you keep MuleSoft flows observable?",
+    "What would you do if a deploy doubled p99 latency?",
+]
+
+ERROR_MARKERS = (b"[stage1_http_error]", b"[ollama_error]", b"[stage1_error]", b'"type": "error"')
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Load generator for the MT chain proxy")
+    ap.add_argument("--base", default="http://127.0.0.1:8000")
+    ap.add_argument("--endpoints", default="/ask_me=3,/ask_me_neg=1,/ask=1,/ask_llama=1", help="path=weight,...")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=200, help="total requests (ignored with --duration)")
+    ap.add_argument("--duration", type=float, default=0.0, help="run for N seconds instead of --requests")
+    ap.add_argument("--repeat-prompts", action="store_true", help="reuse a small prompt set (exercises cache/coalescing)")
+    ap.add_argument("--overlap", action="store_true", help="send overlap=true on chain requests")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--api-key", default=os.getenv("API_KEY", ""))
+    ap.add_argument("--json", default="", help="write the summary as JSON to this path")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--spawn", action="store_true", help="start mock upstreams + server.py on free ports")
+    ap.add_argument("--mock-args", default="", help="extra args for bench/mock_upstreams.py (with --spawn)")
+    ap.add_argument("--server-env", default="", help="extra KEY=VAL pairs for server.py (with --spawn)")
+    return ap.parse_args(argv)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, timeout_s: float = 30.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"timed out waiting for {url}")
+
+
+def spawn_stack(args):
+    mock_port, server_port = _free_port(), _free_port()
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "mock_upstreams.py"), "--port", str(mock_port), *shlex.split(args.mock_args)],
+    )
+    env = dict(os.environ)
+    env.update(
+        PORT=str(server_port),
+        LLAMA_URL=f"http://127.0.0.1:{mock_port}/completion",
+        OLLAMA_URL=f"http://127.0.0.1:{mock_port}/api/chat",
+    )
+    for kv in shlex.split(args.server_env):
+        k, _, v = kv.partition("=")
+        env[k] = v
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "server.py")], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_http(f"http://127.0.0.1:{mock_port}/api/ps")
+        _wait_http(f"http://127.0.0.1:{server_port}/health")
+    except Exception:
+        for p in (server, mock):
+            p.terminate()
+        raise
+    return f"http://127.0.0.1:{server_port}", [server, mock]
+
+
+def parse_endpoints(spec: str):
+    out = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        path, _, w = part.partition("=")
+        out.append((path.strip(), float(w or 1)))
+    return out
+
+
+def make_body(path: str, i: int, args) -> dict:
+    q = QUESTIONS[i % len(QUESTIONS)]
+    if not args.repeat_prompts:
+        q = f"{q} (take {i})"
+    prompt = f"[10:{i % 60:02d}] Interviewer: {q}"
+    if path == "/ask":
+        return {"prompt": f"Fix the grammar: {q}", "report_timings": True, "no_cache": not args.repeat_prompts}
+    body = {"prompt": prompt, "report_timings": True, "no_cache": not args.repeat_prompts}
+    if args.overlap and path != "/ask_llama":
+        body["overlap"] = True
+    return body
+
+
+def parse_trailer(data: bytes) -> dict:
+    j = data.rfind(b"[timings] ")
+    if j < 0:
+        return parse_timings_event(data)
+    line = data[j + len(b"[timings] "):].split(b"\n", 1)[0]
+    try:
+        return json.loads(line.decode("utf-8", errors="replace"))
+    except Exception:
+        return {}
+
+
+def parse_timings_event(data: bytes) -> dict:
+    # NDJSON event streams (/ask_me_both): {"type": "timings", "scope": "request", "data": {...}}
+    for line in reversed(data.split(b"\n")):
+        if b'"scope": "request"' not in line:
+            continue
+        try:
+            rec = json.loads(line.decode("utf-8", errors="replace")).get("data") or {}
+        except Exception:
+            return {}
+        # per-mode stage fields: report the slower mode
+        for m in (rec.get("modes") or {}).values():
+            for k in ("stage1_ttft_ms", "stage2_ttft_ms"):
+                if m.get(k) is not None and (rec.get(k) is None or m[k] > rec[k]):
+                    rec[k] = m[k]
+        return rec
+    return {}
+
+
+async def one_request(client: httpx.AsyncClient, path: str, body: dict, headers: dict) -> dict:
+    t0 = time.perf_counter()
+    ttfb = None
+    chunks = []
+    status = 0
+    err = ""
+    try:
+        async with client.stream("POST", path, json=body, headers=headers) as r:
+            status = r.status_code
+            async for ch in r.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - t0
+                chunks.append(ch)
+    except Exception as e:
+        err = type(e).__name__
+    total = time.perf_counter() - t0
+    data = b"".join(chunks)
+    if not err and status != 200:
+        err = f"http_{status}"
+    if not err and any(m in data for m in ERROR_MARKERS):
+        err = "upstream_marker"
+    return {"path": path, "total_s": total, "ttfb_s": ttfb, "bytes": len(data), "error": err, "timings": parse_trailer(data)}
+
+
+async def run_load(args, base: str) -> tuple:
+    rnd = random.Random(args.seed)
+    eps = parse_endpoints(args.endpoints)
+    paths, weights = [p for p, _ in eps], [w for _, w in eps]
+    headers = {"x-api-key": args.api_key} if args.api_key else {}
+    results = []
+    counter = {"i": 0}
+    deadline = time.monotonic() + args.duration if args.duration > 0 else None
+
+    def _next():
+        if deadline is not None:
+            if time.monotonic() >= deadline:
+                return None
+        elif counter["i"] >= args.requests:
+            return None
+        counter["i"] += 1
+        return counter["i"]
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=args.timeout, limits=limits) as client:
+
+        async def worker():
+            while True:
+                i = _next()
+                if i is None:
+                    return
+                path = rnd.choices(paths, weights)[0]
+                results.append(await one_request(client, path, make_body(path, i, args), headers))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(args.concurrency, 1))))
+        wall = time.perf_counter() - t0
+    return results, wall
+
+
+def pct(values, p: float):
+    vals = sorted(v for v in values if v is not None)
+    if not vals:
+        return None
+    k = max(int(round(p / 100.0 * len(vals) + 0.5)) - 1, 0)
+    return vals[min(k, len(vals) - 1)]
+
+
+def _ms(v):
+    return None if v is None else round(v * 1000.0, 1)
+
+
+def summarize(results, wall: float) -> dict:
+    by_path = {}
+    for r in results:
+        by_path.setdefault(r["path"], []).append(r)
+    out = {"wall_s": round(wall, 3), "requests": len(results), "endpoints": {}}
+    out["req_per_s"] = round(len(results) / wall, 2) if wall > 0 else 0.0
+    out["kb_per_s"] = round(sum(r["bytes"] for r in results) / 1024.0 / wall, 1) if wall > 0 else 0.0
+    out["errors"] = sum(1 for r in results if r["error"])
+    for path, rs in sorted(by_path.items()):
+        ok = [r for r in rs if not r["error"]]
+        tot = [r["total_s"] for r in ok]
+        s1 = [r["timings"].get("stage1_ttft_ms") for r in ok]
+        s2 = [r["timings"].get("stage2_ttft_ms") for r in ok]
+        errs = {}
+        for r in rs:
+            if r["error"]:
+                errs[r["error"]] = errs.get(r["error"], 0) + 1
+        out["endpoints"][path] = {
+            "n": len(rs),
+            "errors": errs,
+            "p50_ms": _ms(pct(tot, 50)),
+            "p95_ms": _ms(pct(tot, 95)),
+            "p99_ms": _ms(pct(tot, 99)),
+            "ttfb_p50_ms": _ms(pct([r["ttfb_s"] for r in ok], 50)),
+            "stage1_ttft_p50_ms": pct(s1, 50),
+            "stage1_ttft_p95_ms": pct(s1, 95),
+            "stage2_ttft_p50_ms": pct(s2, 50),
+            "stage2_ttft_p95_ms": pct(s2, 95),
+            "req_per_s": round(len(rs) / wall, 2) if wall > 0 else 0.0,
+        }
+    return out
+
+
+def print_summary(summary: dict):
+    cols = ["n", "p50_ms", "p95_ms", "p99_ms", "ttfb_p50_ms", "stage1_ttft_p50_ms", "stage1_ttft_p95_ms", "stage2_ttft_p50_ms", "stage2_ttft_p95_ms"]
+    print(f"{'endpoint':<12} " + " ".join(f"{c:>18}" for c in cols) + "  errors")
+    for path, st in summary["endpoints"].items():
+        vals = ["-" if st[c] is None else str(st[c]) for c in cols]
+        print(f"{path:<12} " + " ".join(f"{v:>18}" for v in vals) + f"  {st['errors'] or ''}")
+    print(
+        f"\ntotal={summary['requests']} errors={summary['errors']} wall={summary['wall_s']}s "
+        f"throughput={summary['req_per_s']} req/s {summary['kb_per_s']} KB/s"
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    procs = []
+    base = args.base
+    if args.spawn:
+        base, procs = spawn_stack(args)
+        print(f"spawned server at {base}", flush=True)
+    try:
+        results, wall = asyncio.run(run_load(args, base))
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=5)
+            except Exception:
+                p.kill()
+    summary = summarize(results, wall)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
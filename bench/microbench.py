@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# bench/microbench.py — hot-path microbenchmarks with stored baselines (regression gate)
+#
+# Times the per-request parser/filter helpers over bench/corpus.py inputs (up to 20k chars):
+#  extract_last_valid, parse_prompt, parse_line_author_and_text, _parse_teams_inline,
+#  is_code_like, is_noise_text, _hint_lang_from_text, _clean_stage1_text
+#
+# Each case reports best-of-N per-call µs (GC off, like timeit). Compare on the machine that
+# recorded the baseline; --normalize scales by a pure-Python calibration loop for rough
+# cross-machine comparisons.
+#
+# Usage:
+#   python bench/microbench.py                       # compare with bench/baselines/microbench.json
+#   python bench/microbench.py --threshold 0.15      # fail if any case is >15% slower
+#   python bench/microbench.py --save                # (re)record the baseline
+#   python bench/microbench.py --normalize           # baseline came from another machine
+#   python bench/microbench.py --filter teams        # only cases whose name contains "teams"
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+from bench import corpus  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "microbench.json")
+
+
+def _calibration_loop():
+    # fixed pure-Python work (string ops + dict churn), close to what the parsers do
+    d = {}
+    s = "Interviewer: how would you design it?"
+    for i in range(2000):
+        k = s[i % 20:]
+        d[k] = d.get(k, 0) + len(k.lower().split(":"))
+    return d
+
+
+def build_cases(chars: int) -> list:
+    # (name, fn, arg) — fn(arg) is one timed call
+    cases = []
+    for sc in corpus.SCENARIOS:
+        raw = corpus.transcript(sc, chars)
+        cases.append((f"extract_last_valid/{sc}", server.extract_last_valid, raw))
+        cases.append((f"parse_prompt/{sc}", server.parse_prompt, raw))
+    teams = corpus.teams_inline(chars)
+    cases.append(("_parse_teams_inline/teams_inline", server._parse_teams_inline, teams))
+
+    lines = corpus.sample_lines()
+    texts = [(server.parse_line_author_and_text(ln) or {}).get("text") or ln for ln in lines]
+    drafts = corpus.sample_drafts()
+
+    def _each(fn, items):
+        def run(_arg):
+            for x in items:
+                fn(x)
+
+        return run
+
+    cases.append((f"parse_line_author_and_text/lines{len(lines)}", _each(server.parse_line_author_and_text, lines), None))
+    cases.append((f"is_code_like/lines{len(texts)}", _each(server.is_code_like, texts), None))
+    cases.append((f"is_noise_text/lines{len(texts)}", _each(server.is_noise_text, texts), None))
+    cases.append((f"_hint_lang_from_text/lines{len(texts)}", _each(server._hint_lang_from_text, texts), None))
+    cases.append((f"_clean_stage1_text/drafts{len(drafts)}", _each(server._clean_stage1_text, drafts), None))
+    return cases
+
+
+def time_case(fn, arg, rounds: int, min_round_s: float) -> float:
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _time_case(fn, arg, rounds, min_round_s)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _time_case(fn, arg, rounds: int, min_round_s: float) -> float:
+    # best-of-rounds per-call µs; the number of calls per round is calibrated to ~min_round_s
+    fn(arg)
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn(arg)
+        dt = time.perf_counter() - t0
+        if dt >= min_round_s or number >= 1 << 20:
+            break
+        number *= 2
+    best = dt / number
+    for _ in range(rounds - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn(arg)
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best * 1e6
+
+
+def run(args, only=None, passes: int = 1) -> dict:
+    # passes > 1 keeps the best time per case across passes (noise on shared hosts only adds time)
+    cal = time_case(lambda _a: _calibration_loop(), None, args.rounds, args.min_round_s)
+    results = {}
+    for _ in range(max(passes, 1)):
+        for name, fn, arg in build_cases(args.chars):
+            if (args.filter and args.filter not in name) or (only is not None and name not in only):
+                continue
+            us = round(time_case(fn, arg, args.rounds, args.min_round_s), 2)
+            results[name] = min(us, results.get(name, us))
+    return {
+        "chars": args.chars,
+        "calibration_us": round(cal, 2),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": results,
+    }
+
+
+def compare(now: dict, base: dict, threshold: float, normalize: bool = False) -> list:
+    # returns [(name, base_us, now_us, ratio, failed)]; normalize=True divides out machine speed
+    scale = 1.0
+    if normalize and base.get("calibration_us"):
+        scale = now["calibration_us"] / base["calibration_us"]
+    rows = []
+    for name, now_us in now["cases"].items():
+        base_us = base.get("cases", {}).get(name)
+        if base_us is None:
+            rows.append((name, None, now_us, None, False))
+            continue
+        ratio = (now_us / scale) / base_us if base_us > 0 else 1.0
+        rows.append((name, base_us, now_us, ratio, ratio > 1.0 + threshold))
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parser/filter microbenchmarks with baseline gate")
+    ap.add_argument("--chars", type=int, default=server.MAX_PROMPT_CHARS)
+    ap.add_argument("--rounds", type=int, default=15)
+    ap.add_argument("--min-round-s", type=float, default=0.04)
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = +25%%)")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--normalize", action="store_true", help="scale by the calibration loop (cross-machine)")
+    ap.add_argument("--filter", default="")
+    ap.add_argument("--passes", type=int, default=3, help="passes when recording a baseline (best per case)")
+    ap.add_argument("--retries", type=int, default=2, help="re-time cases over the threshold before failing")
+    args = ap.parse_args(argv)
+
+    now = run(args, passes=args.passes if args.save else 1)
+    print(f"chars={now['chars']} calibration_us={now['calibration_us']} python={now['python']}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(now, f, indent=2, sort_keys=True)
+            f.write("\n")
+        for name, us in now["cases"].items():
+            print(f"{name:<48} {us:>10.2f} us")
+        print(f"baseline saved: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save first")
+        return 2
+    with open(args.baseline, encoding="utf-8") as f:
+        base = json.load(f)
+    if base.get("chars") != now["chars"]:
+        print(f"warning: baseline recorded with chars={base.get('chars')}, now {now['chars']}")
+
+    for _ in range(max(args.retries, 0)):
+        slow = {r[0] for r in compare(now, base, args.threshold, normalize=args.normalize) if r[4]}
+        if not slow:
+            break
+        again = run(args, only=slow)
+        for name, us in again["cases"].items():
+            now["cases"][name] = min(us, now["cases"][name])
+
+    failed = 0
+    print(f"{'case':<48} {'base_us':>10} {'now_us':>10} {'ratio':>7}")
+    for name, base_us, now_us, ratio, bad in compare(now, base, args.threshold, normalize=args.normalize):
+        b = "-" if base_us is None else f"{base_us:.2f}"
+        r = "new" if ratio is None else f"{ratio:.2f}x"
+        print(f"{name:<48} {b:>10} {now_us:>10.2f} {r:>7}{'  SLOWER' if bad else ''}")
+        failed += int(bad)
+    if failed:
+        print(f"\nFAIL: {failed} case(s) slower than baseline by more than {args.threshold:.0%}")
+        return 1
+    print(f"\nOK: all cases within {args.threshold:.0%} of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
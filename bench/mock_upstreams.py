@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# bench/mock_upstreams.py — fake llama.cpp + Ollama for load tests (no models needed)
+#
+# Serves on one port:
+#  - POST /completion  -> llama.cpp-style SSE ("data: {content, stop, timings}")
+#  - POST /api/chat    -> Ollama-style NDJSON (stream=true) or one JSON object (stream=false)
+#  - GET  /api/ps      -> lists OLLAMA_MODEL as loaded (keeps the warm-up probe quiet)
+#  - GET  /health      -> llama-server health check (stage-1 pool probes)
+#
+# Knobs (flags or MOCK_* env): TTFT, tokens/sec, tokens per reply, error rate, stall rate/length.
+#
+# Usage:
+#   python bench/mock_upstreams.py --port 9101 --ttft-ms 150 --tps 60
+#   then: LLAMA_URL=http://127.0.0.1:9101/completion OLLAMA_URL=http://127.0.0.1:9101/api/chat python server.py
+
+import argparse
+import asyncio
+import json
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "I have worked with MuleSoft and Kafka for five years, mostly on integration "
+    "platforms, event streaming, API design, observability and on-call for payment flows."
+).split()
+
+
+def _env(name: str, default: str) -> str:
+    return os.getenv(name, default)
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Mock llama.cpp /completion + Ollama /api/chat")
+    ap.add_argument("--host", default=_env("MOCK_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(_env("MOCK_PORT", "9101")))
+    ap.add_argument("--ttft-ms", type=float, default=float(_env("MOCK_TTFT_MS", "150")), help="delay before the first token")
+    ap.add_argument("--jitter-ms", type=float, default=float(_env("MOCK_JITTER_MS", "0")), help="uniform +/- jitter on TTFT")
+    ap.add_argument("--tps", type=float, default=float(_env("MOCK_TPS", "60")), help="tokens/sec after the first token")
+    ap.add_argument("--tokens", type=int, default=int(_env("MOCK_TOKENS", "40")), help="tokens per reply")
+    ap.add_argument("--error-rate", type=float, default=float(_env("MOCK_ERROR_RATE", "0")), help="0..1, HTTP 500 instead of a reply")
+    ap.add_argument("--stall-rate", type=float, default=float(_env("MOCK_STALL_RATE", "0")), help="0..1, pause once mid-stream")
+    ap.add_argument("--stall-ms", type=float, default=float(_env("MOCK_STALL_MS", "2000")))
+    ap.add_argument("--model", default=_env("OLLAMA_MODEL", "gpt-oss:120b-cloud"))
+    return ap.parse_args(argv)
+
+
+def build_app(cfg) -> FastAPI:
+    app = FastAPI(title="bench mock upstreams")
+    stats = {"completion": 0, "chat": 0, "errors": 0, "stalls": 0}
+
+    def _ttft_s() -> float:
+        j = random.uniform(-cfg.jitter_ms, cfg.jitter_ms) if cfg.jitter_ms > 0 else 0.0
+        return max(cfg.ttft_ms + j, 0.0) / 1000.0
+
+    def _tokens(n: int):
+        return [(" " if i else "") + WORDS[i % len(WORDS)] for i in range(max(n, 1))]
+
+    async def _paced(tokens):
+        # yields tokens with TTFT, steady tps and (maybe) one stall somewhere in the middle
+        stall_at = random.randrange(1, len(tokens)) if len(tokens) > 1 and random.random() < cfg.stall_rate else -1
+        if stall_at >= 0:
+            stats["stalls"] += 1
+        gap = 1.0 / cfg.tps if cfg.tps > 0 else 0.0
+        await asyncio.sleep(_ttft_s())
+        for i, tok in enumerate(tokens):
+            if i == stall_at:
+                await asyncio.sleep(cfg.stall_ms / 1000.0)
+            elif i:
+                await asyncio.sleep(gap)
+            yield tok
+
+    def _fail() -> bool:
+        if cfg.error_rate > 0 and random.random() < cfg.error_rate:
+            stats["errors"] += 1
+            return True
+        return False
+
+    @app.post("/completion")
+    async def completion(req: Request):
+        body = await req.json()
+        stats["completion"] += 1
+        if _fail():
+            return JSONResponse({"error": "mock failure"}, status_code=500)
+        n = min(int(body.get("n_predict") or cfg.tokens), cfg.tokens)
+        tokens = _tokens(n)
+        prompt_n = max(len(str(body.get("prompt") or "")) // 4, 1)
+
+        async def gen():
+            async for tok in _paced(tokens):
+                yield "data: " + json.dumps({"content": tok, "stop": False}) + "\n\n"
+            timings = {"prompt_n": prompt_n, "cache_n": 0, "prompt_ms": prompt_n * 0.2, "predicted_n": len(tokens)}
+            yield "data: " + json.dumps({"content": "", "stop": True, "timings": timings}) + "\n\n"
+
+        return StreamingResponse(gen(), media_type="text/event-stream")
+
+    @app.post("/api/chat")
+    async def chat(req: Request):
+        body = await req.json()
+        stats["chat"] += 1
+        if _fail():
+            return JSONResponse({"error": "mock failure"}, status_code=500)
+        limit = int(((body.get("options") or {}).get("num_predict")) or cfg.tokens)
+        tokens = _tokens(min(limit, cfg.tokens))
+        if not body.get("stream"):
+            parts = [tok async for tok in _paced(tokens)]
+            return JSONResponse({"model": cfg.model, "message": {"role": "assistant", "content": "".join(parts)}, "done": True})
+
+        async def gen():
+            async for tok in _paced(tokens):
+                yield json.dumps({"model": cfg.model, "message": {"role": "assistant", "content": tok}, "done": False}) + "\n"
+            yield json.dumps({"model": cfg.model, "message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+        return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+    @app.get("/api/ps")
+    async def ps():
+        return {"models": [{"name": cfg.model, "model": cfg.model}]}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/_stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    cfg = parse_args(argv)
+    print(
+        f"mock upstreams on http://{cfg.host}:{cfg.port} ttft={cfg.ttft_ms}ms tps={cfg.tps} tokens={cfg.tokens} "
+        f"error_rate={cfg.error_rate} stall_rate={cfg.stall_rate}",
+        flush=True,
+    )
+    uvicorn.run(build_app(cfg), host=cfg.host, port=cfg.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
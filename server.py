@@ -10,6 +10,11 @@
 #  - POST /ask_me        -> CHAIN positive (stage1 -> 120b) ✅ stage1 stream DEFAULT ON
 #  - POST /ask_me_neg    -> CHAIN negative (stage1 -> 120b) ✅ stage1 stream DEFAULT ON
 #  - /health noting prompt files
+#  - GET  /metrics       -> Prometheus text format (stage latencies, errors, truncations)
+#
+# ✅ Upstreams via httpx.AsyncClient (pooled keep-alive, HTTP/1.1):
+#  - one shared client per upstream (stage1 = llama.cpp, stage2 = Ollama)
+#  - pool limits via UPSTREAM_POOL_* env vars
 #
 # ✅ Prompts fora do código (TXT):
 #  - prompts/stage1_system.txt
@@ -29,8 +34,15 @@ import hashlib
 import threading
 import logging
 import subprocess
+import asyncio
+import contextvars
+import heapq
+import math
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Iterator, Optional, Tuple
+from typing import AsyncIterator, NamedTuple, Optional, Tuple
 from datetime import datetime
 
 try:
@@ -41,7 +53,7 @@ except Exception:
 # =========================
 # 📦 AUTO-INSTALL (libs)
 # =========================
-REQUIRED = ["fastapi", "uvicorn[standard]", "requests", "pydantic"]
+REQUIRED = ["fastapi", "uvicorn[standard]", "httpx", "pydantic"]
 
 
 def _pip_install(pkgs):
@@ -67,9 +79,9 @@ ensure_deps()
 # =========================
 # ✅ Imports (after install)
 # =========================
-import requests
-from fastapi import FastAPI, Request, BackgroundTasks, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+import httpx
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, ValidationError
 
@@ -78,6 +90,7 @@ from pydantic import BaseModel, Field, ValidationError
 # =========================
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 log = logging.getLogger("mt-chain-proxy")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # per-request upstream lines are too chatty
 
 # =========================
 # ✅ Streaming headers (anti-buffer)
@@ -110,7 +123,20 @@ PROMPT_FILES = {
     "stage2_consolidator": "stage2_consolidator.txt",
 }
 
-_PROMPT_CACHE = {}  # key -> {"text": str, "mtime": float}
+PROMPTS_POLL_S = float(os.getenv("PROMPTS_POLL_S", "1.0"))  # watcher period (PROMPTS_AUTO_RELOAD)
+
+
+class PromptSnapshot(NamedTuple):
+    # Immutable view of every PROMPT_FILES entry. Readers grab the module-level reference once;
+    # the watcher thread builds a new snapshot and swaps the reference (no locks on the hot path).
+    version: str  # content digest, usable as a cache key part
+    texts: dict
+    signature: tuple  # (key, mtime_ns, size) per file, compared by the watcher
+    loaded_at: float
+
+
+_PROMPTS: Optional[PromptSnapshot] = None
+PROMPT_RELOADS = {"reloads": 0, "failures": 0, "last_error": ""}
 
 
 def _read_text_file(path: Path) -> str:
@@ -120,35 +146,116 @@ def _read_text_file(path: Path) -> str:
     return txt
 
 
+def _prompt_files_signature() -> tuple:
+    sig = []
+    for k, name in PROMPT_FILES.items():
+        try:
+            st = (PROMPTS_DIR / name).stat()
+            sig.append((k, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((k, 0, -1))
+    return tuple(sig)
+
+
+def _build_prompt_snapshot() -> PromptSnapshot:
+    sig = _prompt_files_signature()
+    texts = {}
+    for k, name in PROMPT_FILES.items():
+        path = PROMPTS_DIR / name
+        if not path.exists():
+            if PROMPTS_STRICT:
+                raise RuntimeError(f"Missing prompt file: {path}")
+            log.warning("[prompts] missing file: %s (using empty)", path)
+            texts[k] = ""
+            continue
+        texts[k] = _read_text_file(path)
+    h = hashlib.sha1()
+    for k in PROMPT_FILES.keys():
+        h.update(k.encode("utf-8") + b"\x1f" + texts[k].encode("utf-8") + b"\x1e")
+    return PromptSnapshot(h.hexdigest()[:16], texts, sig, time.time())
+
+
+def reload_prompts(force: bool = False) -> bool:
+    # returns True when a new snapshot was published; a failed reload keeps the previous one
+    global _PROMPTS
+    cur = _PROMPTS
+    if cur is not None and not force and _prompt_files_signature() == cur.signature:
+        return False
+    try:
+        snap = _build_prompt_snapshot()
+    except Exception as e:
+        if cur is None:
+            raise
+        if PROMPT_RELOADS["last_error"] != str(e)[:200]:  # log once per distinct error, not every poll
+            PROMPT_RELOADS["failures"] += 1
+            PROMPT_RELOADS["last_error"] = str(e)[:200]
+            log.warning("[prompts] reload failed, keeping version=%s: %s", cur.version, e)
+        return False
+    if cur is not None and snap.version == cur.version:
+        _PROMPTS = cur._replace(signature=snap.signature)  # touched, same content
+        return False
+    _PROMPTS = snap
+    PROMPT_RELOADS["last_error"] = ""
+    if cur is not None:
+        PROMPT_RELOADS["reloads"] += 1
+        log.info("[prompts] reloaded version=%s (was %s)", snap.version, cur.version)
+    return True
+
+
 def load_prompt(key: str) -> str:
-    if key not in PROMPT_FILES:
+    # hot path: dict lookup on the current snapshot, no filesystem access
+    try:
+        return _PROMPTS.texts[key]
+    except KeyError:
         raise RuntimeError(f"Unknown prompt key: {key}")
-    path = PROMPTS_DIR / PROMPT_FILES[key]
-    if not path.exists():
-        if PROMPTS_STRICT:
-            raise RuntimeError(f"Missing prompt file: {path}")
-        log.warning("[prompts] missing file: %s (returning empty)", path)
-        return ""
 
-    try:
-        mtime = path.stat().st_mtime
-    except Exception:
-        mtime = 0.0
 
-    cached = _PROMPT_CACHE.get(key)
-    if cached and (not PROMPTS_AUTO_RELOAD or cached.get("mtime") == mtime):
-        return cached.get("text", "")
+def prompt_files_version() -> str:
+    # content digest of the current prompt snapshot; usable as a cache key part
+    return _PROMPTS.version
 
-    txt = _read_text_file(path)
-    _PROMPT_CACHE[key] = {"text": txt, "mtime": mtime}
-    return txt
+
+class PromptWatcher:
+    # Cheap stat() poll on a daemon thread (stdlib only; no inotify dependency). One syscall per
+    # prompt file every PROMPTS_POLL_S, instead of one per load_prompt() call per request.
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not PROMPTS_AUTO_RELOAD or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="prompt-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(max(PROMPTS_POLL_S, 0.05)):
+            try:
+                reload_prompts()
+            except Exception as e:
+                log.warning("[prompts] watcher error: %s", e)
+
+
+PROMPT_WATCHER = PromptWatcher()
 
 
 def _load_all_prompts_on_startup():
     # fail-fast se PROMPTS_STRICT=true
-    for k in PROMPT_FILES.keys():
-        _ = load_prompt(k)
-    log.info("[prompts] loaded dir=%s strict=%s auto_reload=%s", PROMPTS_DIR, PROMPTS_STRICT, PROMPTS_AUTO_RELOAD)
+    reload_prompts(force=True)
+    log.info(
+        "[prompts] loaded dir=%s strict=%s auto_reload=%s version=%s",
+        PROMPTS_DIR,
+        PROMPTS_STRICT,
+        PROMPTS_AUTO_RELOAD,
+        _PROMPTS.version,
+    )
 
 
 _load_all_prompts_on_startup()
@@ -360,9 +467,112 @@ MAX_DRAFT_CHARS = int(os.getenv("MAX_DRAFT_CHARS", "6000"))
 API_KEY = os.getenv("API_KEY", "").strip()  # optional x-api-key
 FILTER_NOISE = True
 
+# ---- Upstream HTTP pools (one AsyncClient per upstream, HTTP/1.1 keep-alive)
+UPSTREAM_POOL_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_POOL_MAX_CONNECTIONS", "32"))
+UPSTREAM_POOL_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_POOL_MAX_KEEPALIVE", "16"))
+UPSTREAM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_POOL_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_POOL_TIMEOUT = float(os.getenv("UPSTREAM_POOL_TIMEOUT", "10"))
+
+# ---- Client disconnect polling (closes upstream streams nobody will read)
+DISCONNECT_POLL_MS = int(os.getenv("DISCONNECT_POLL_MS", "250"))
+
+# ---- Response cache (TTL + LRU) for /ask, /ask_me, /ask_me_neg
+RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", True)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", "900"))
+
+# ---- Stage-1 draft memo (speech/mode/stage1 prompts -> draft; independent of the consolidated context)
+DRAFT_CACHE_ENABLED = _env_bool("DRAFT_CACHE_ENABLED", True)
+DRAFT_CACHE_MAX_ENTRIES = int(os.getenv("DRAFT_CACHE_MAX_ENTRIES", "512"))
+DRAFT_CACHE_MAX_BYTES = int(os.getenv("DRAFT_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+DRAFT_CACHE_TTL_S = float(os.getenv("DRAFT_CACHE_TTL_S", "1800"))
+
+# ---- Sessions: per-meeting conversation state + delta transcript buffers
+SESSION_TRANSCRIPT_MAX_CHARS = int(os.getenv("SESSION_TRANSCRIPT_MAX_CHARS", str(MAX_PROMPT_CHARS)))
+SESSIONS_MAX = int(os.getenv("SESSIONS_MAX", "64"))
+SESSION_IDLE_TTL_S = float(os.getenv("SESSION_IDLE_TTL_S", "7200"))
+
+# ---- Consolidator worker (background 120b summaries)
+CONSOLIDATOR_DEBOUNCE_MS = int(os.getenv("CONSOLIDATOR_DEBOUNCE_MS", "1500"))
+CONSOLIDATOR_MAX_DELAY_MS = int(os.getenv("CONSOLIDATOR_MAX_DELAY_MS", "10000"))  # debounce can't starve a session
+CONSOLIDATOR_MAX_DEFER_MS = int(os.getenv("CONSOLIDATOR_MAX_DEFER_MS", "15000"))  # max wait for interactive streams
+CONSOLIDATOR_CONCURRENCY = int(os.getenv("CONSOLIDATOR_CONCURRENCY", "1"))  # across sessions
+CONSOLIDATOR_INCREMENTAL = _env_bool("CONSOLIDATOR_INCREMENTAL", True)  # previous context + new messages only
+CONSOLIDATOR_FULL_EVERY = int(os.getenv("CONSOLIDATOR_FULL_EVERY", "8"))  # full re-summary after N incremental runs
+CONSOLIDATOR_CONTEXT_MAX_CHARS = int(os.getenv("CONSOLIDATOR_CONTEXT_MAX_CHARS", "1200"))
+SESSIONS_MEMORY_MAX_BYTES = int(os.getenv("SESSIONS_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+CLEAN_BUFFER_MAX = int(os.getenv("CLEAN_BUFFER_MAX", "60"))  # per-session message ring size
+
+# ---- Single-flight: identical in-flight chain requests share one upstream generation
+COALESCE_ENABLED = _env_bool("COALESCE_ENABLED", True)
+
+# ---- Latest-wins preemption: a newer request with the same key cancels the older one's upstream calls
+PREEMPT_DEFAULT = _env_bool("PREEMPT_DEFAULT", False)  # per request: "preempt": true|false
+
+# ---- Stage 1 KV-cache reuse (llama.cpp)
+STAGE1_STABLE_PREFIX = _env_bool("STAGE1_STABLE_PREFIX", True)  # time/speech at the tail, not in the system prompt
+STAGE1_CACHE_PROMPT = _env_bool("STAGE1_CACHE_PROMPT", True)  # llama.cpp cache_prompt
+LLAMA_SLOTS = int(os.getenv("LLAMA_SLOTS", "0"))  # >0: pin id_slot per session (match llama-server --parallel)
+
+# ---- Stage 1 backend pool (several llama.cpp servers; LLAMA_URL is used alone when LLAMA_URLS is empty)
+LLAMA_URLS = [u.strip() for u in os.getenv("LLAMA_URLS", "").split(",") if u.strip()]
+LLAMA_POOL_POLICY = os.getenv("LLAMA_POOL_POLICY", "least_outstanding").strip().lower()  # | latency
+LLAMA_POOL_STICKY = _env_bool("LLAMA_POOL_STICKY", True)  # same session -> same backend (warm prompt cache)
+LLAMA_POOL_STICKY_SLACK = int(os.getenv("LLAMA_POOL_STICKY_SLACK", "2"))  # spill when sticky has N more in flight
+LLAMA_POOL_PROBE_S = float(os.getenv("LLAMA_POOL_PROBE_S", "10"))  # GET /health on each backend (0 = off)
+LLAMA_POOL_EJECT_FAILS = int(os.getenv("LLAMA_POOL_EJECT_FAILS", "3"))  # consecutive failures before ejection
+LLAMA_POOL_EJECT_S = float(os.getenv("LLAMA_POOL_EJECT_S", "30"))  # min time out of rotation
+LLAMA_POOL_FAILOVER = _env_bool("LLAMA_POOL_FAILOVER", True)  # retry on another backend if nothing was streamed yet
+
+# ---- Warm-up / keep-alive (tiny generations so the first real request doesn't pay model load)
+WARMUP_ENABLED = _env_bool("WARMUP_ENABLED", True)
+WARMUP_ON_STARTUP = _env_bool("WARMUP_ON_STARTUP", True)
+WARMUP_INTERVAL_S = float(os.getenv("WARMUP_INTERVAL_S", "240"))  # re-warm a target idle for this long
+WARMUP_CHECK_S = float(os.getenv("WARMUP_CHECK_S", "30"))  # eviction probe / idle check period
+WARMUP_LLAMA = _env_bool("WARMUP_LLAMA", True)
+WARMUP_OLLAMA = _env_bool("WARMUP_OLLAMA", True)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m").strip()  # sent on every /api/chat ("" = server default)
+
+# ---- Admission control (per-upstream concurrency limits + priority wait queue, shed with 429/503)
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED", True)
+ADMISSION_STAGE1_LIMIT = int(os.getenv("ADMISSION_STAGE1_LIMIT", "0"))  # concurrent llama.cpp streams (0 = 4 per backend)
+ADMISSION_STAGE2_LIMIT = int(os.getenv("ADMISSION_STAGE2_LIMIT", "8"))  # concurrent Ollama calls
+ADMISSION_QUEUE_MAX = int(os.getenv("ADMISSION_QUEUE_MAX", "32"))  # waiters per upstream before 429
+ADMISSION_WAIT_MS = {  # max queue wait per priority class before 503
+    "interactive": int(os.getenv("ADMISSION_WAIT_INTERACTIVE_MS", "3000")),  # /ask_me, /ask_me_neg, /ask_llama
+    "rewrite": int(os.getenv("ADMISSION_WAIT_REWRITE_MS", "5000")),  # /ask
+    "background": int(os.getenv("ADMISSION_WAIT_BACKGROUND_MS", "60000")),  # context consolidation
+}
+
+# ---- Stage 2 hedging (same request to a fallback model/endpoint when the first token is slow)
+STAGE2_HEDGE_AFTER_MS = int(os.getenv("STAGE2_HEDGE_AFTER_MS", "0"))  # no first token by then -> hedge (0 = off)
+STAGE2_HEDGE_MODEL = os.getenv("STAGE2_HEDGE_MODEL", "").strip()  # "" = same MODEL
+STAGE2_HEDGE_URL = os.getenv("STAGE2_HEDGE_URL", "").strip()  # "" = same OLLAMA_URL
+STAGE2_HEDGE_ON_ERROR = _env_bool("STAGE2_HEDGE_ON_ERROR", True)  # also hedge right away if the primary fails first
+
+# ---- Prometheus /metrics (in-process histograms/counters, text exposition format)
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+
+# ---- Per-request timing: X-Request-ID, one JSON log record per request, optional in-band trailer
+TIMING_LOG_ENABLED = _env_bool("TIMING_LOG_ENABLED", True)
+TIMING_TRAILER_DEFAULT = _env_bool("TIMING_TRAILER_DEFAULT", False)  # else only with report_timings=true
+
+# ---- Event-stream responses (opt-in stream_format=ndjson|sse instead of text + [markers])
+STREAM_FORMAT_DEFAULT = os.getenv("STREAM_FORMAT_DEFAULT", "text").strip().lower()
+EVENT_FLUSH_MS = int(os.getenv("EVENT_FLUSH_MS", "30"))  # batch token deltas for up to N ms (0 = per chunk)
+EVENT_FLUSH_MAX_BYTES = int(os.getenv("EVENT_FLUSH_MAX_BYTES", "1024"))  # ...or until this many bytes
+
 # stage1 stream default ON (preview the 8B while 120B prepares)
 STREAM_STAGE1_DEFAULT = _env_bool("STREAM_STAGE1_DEFAULT", True)
 
+# ---- Speculative overlap (stage2 dispatched before stage1 finishes)
+STAGE2_OVERLAP_DEFAULT = _env_bool("STAGE2_OVERLAP_DEFAULT", False)
+STAGE2_OVERLAP_MIN_TOKENS = int(os.getenv("STAGE2_OVERLAP_MIN_TOKENS", "24"))  # dispatch after N stage1 deltas
+STAGE2_OVERLAP_MIN_CHARS = int(os.getenv("STAGE2_OVERLAP_MIN_CHARS", "40"))  # ...or first full sentence this long
+STAGE2_OVERLAP_DEADLINE_MS = int(os.getenv("STAGE2_OVERLAP_DEADLINE_MS", "1500"))  # ...or no draft at all after this
+STAGE2_OVERLAP_REAP_S = 5.0  # max wait for cancelled overlap tasks to run their cleanup
+
 # =========================
 # ✅ MODE RESOLVER (route -> positivo/negativo)
 # =========================
@@ -416,10 +626,13 @@ def build_llama3_chat_prompt(system: str, user: str) -> str:
     )
 
 
+ECHO_MARKER = "<|start_header_id|>assistant<|end_header_id|>"
+
+
 def strip_prompt_echo(text: str) -> str:
     if not text:
         return text
-    marker = "<|start_header_id|>assistant<|end_header_id|>"
+    marker = ECHO_MARKER
     i = text.lower().find(marker.lower())
     if i >= 0:
         return text[i + len(marker):].strip()
@@ -439,16 +652,606 @@ def find_stop_index(text: str, markers: list[str]) -> int:
     return best
 
 
+class StreamStopMatcher:
+    # Incremental version of strip_prompt_echo + find_stop_index for streamed deltas. Only the
+    # held-back tail (trailing spaces + a possible partial marker, at most one marker long) is
+    # re-scanned with each delta, so a stream costs O(n) instead of O(n^2). Unlike the whole-text
+    # version, a marker split across deltas never leaks its first half to the client.
+    def __init__(self, stops, echo_marker: str = ECHO_MARKER):
+        self._markers = [m.lower() for m in [*stops, echo_marker] if m]
+        self._firsts = {m[0] for m in self._markers}
+        self._window = max((len(m) for m in self._markers), default=1) - 1
+        self._stop_re = re.compile("|".join(re.escape(m) for m in stops if m), re.IGNORECASE) if any(stops) else None
+        self._echo_re = re.compile(re.escape(echo_marker), re.IGNORECASE) if echo_marker else None
+        self._pending = ""
+        self._started = False  # leading whitespace already dropped
+        self.stopped = False
+
+    def _partial_marker_len(self, buf: str) -> int:
+        # longest suffix of buf that is a proper prefix of some marker
+        tail = buf[-self._window:] if self._window > 0 else ""
+        low = tail.lower()
+        if not any(c in low for c in self._firsts):
+            return 0
+        best = 0
+        for m in self._markers:
+            for i in range(max(len(tail) - len(m) + 1, 0), len(tail) - best):
+                if tail[i].lower() == m[0] and m.startswith(tail[i:].lower()):
+                    best = len(tail) - i
+                    break
+        return best
+
+    def feed(self, delta: str) -> str:
+        # returns the text that is now safe to emit
+        if self.stopped:
+            return ""
+        buf = self._pending + delta.replace("\r", "").replace("\n", " ")
+        if self._echo_re is not None:
+            m = self._echo_re.search(buf)
+            if m:
+                buf = buf[m.end():]
+                self._started = False
+        if not self._started:
+            buf = buf.lstrip()
+            if not buf:
+                self._pending = ""
+                return ""
+            self._started = True
+        if self._stop_re is not None:
+            m = self._stop_re.search(buf)
+            if m:
+                self.stopped = True
+                self._pending = ""
+                return buf[: m.start()].rstrip()
+        keep = self._partial_marker_len(buf)
+        out = buf[: len(buf) - keep].rstrip()
+        self._pending = buf[len(out):]
+        return out
+
+    def flush(self) -> str:
+        # end of stream: a dangling partial marker is just text
+        out = "" if self.stopped else self._pending.rstrip()
+        self._pending = ""
+        return out
+
+
+# =========================
+# 🔌 Upstream clients (pooled, keep-alive)
+# =========================
+_UPSTREAM_CLIENTS = {}  # name -> httpx.AsyncClient
+
+_UPSTREAM_TIMEOUTS = {
+    "stage1": (STAGE1_CONNECT_TIMEOUT, STAGE1_TIMEOUT),
+    "stage2": (CONNECT_TIMEOUT, float(TIMEOUT)),
+}
+
+
+def get_upstream_client(name: str) -> httpx.AsyncClient:
+    # created lazily (inside the running loop) and reused for every request
+    client = _UPSTREAM_CLIENTS.get(name)
+    if client is None or client.is_closed:
+        connect_s, total_s = _UPSTREAM_TIMEOUTS.get(name, (CONNECT_TIMEOUT, float(TIMEOUT)))
+        client = httpx.AsyncClient(
+            http1=True,
+            http2=False,
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_POOL_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(total_s, connect=connect_s, pool=UPSTREAM_POOL_TIMEOUT),
+        )
+        _UPSTREAM_CLIENTS[name] = client
+    return client
+
+
+async def close_upstream_clients():
+    clients = list(_UPSTREAM_CLIENTS.values())
+    _UPSTREAM_CLIENTS.clear()
+    for c in clients:
+        try:
+            await c.aclose()
+        except Exception as e:
+            log.info("[upstream] close failed: %s", e)
+
+
+# =========================
+# 📈 Metrics (Prometheus text exposition, no extra dependency)
+# =========================
+METRICS_LOCK = threading.Lock()
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_TPS_BUCKETS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500)
+_BYTES_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+class _Metric:
+    # one family; children keyed by the label-value tuple. Updates are O(buckets) under METRICS_LOCK.
+    def __init__(self, name: str, help_text: str, kind: str, labels=(), buckets=None):
+        self.name = name
+        self.help = help_text
+        self.kind = kind  # counter | histogram
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets or ())
+        self.children = {}
+
+    def _child(self, values: tuple):
+        c = self.children.get(values)
+        if c is None:
+            c = [0.0] if self.kind == "counter" else [[0] * len(self.buckets), 0.0, 0]
+            self.children[values] = c
+        return c
+
+    def inc(self, *values, amount: float = 1.0):
+        if not METRICS_ENABLED:
+            return
+        with METRICS_LOCK:
+            self._child(tuple(str(v) for v in values))[0] += amount
+
+    def observe(self, value: float, *values):
+        if not METRICS_ENABLED:
+            return
+        with METRICS_LOCK:
+            c = self._child(tuple(str(v) for v in values))
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    c[0][i] += 1
+                    break
+            c[1] += value
+            c[2] += 1
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, c in sorted(self.children.items()):
+            pairs = [f'{k}="{_prom_escape(v)}"' for k, v in zip(self.labels, values)]
+            if self.kind == "counter":
+                out.append(f"{self.name}{_prom_labels(pairs)} {_prom_num(c[0])}")
+                continue
+            cum = 0
+            for b, n in zip(self.buckets, c[0]):
+                cum += n
+                le = 'le="%s"' % _prom_num(b)
+                out.append(f"{self.name}_bucket{_prom_labels(pairs + [le])} {cum}")
+            inf = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_prom_labels(pairs + [inf])} {c[2]}")
+            out.append(f"{self.name}_sum{_prom_labels(pairs)} {_prom_num(c[1])}")
+            out.append(f"{self.name}_count{_prom_labels(pairs)} {c[2]}")
+        return out
+
+
+def _prom_escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _prom_labels(pairs: list) -> str:
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _prom_num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+M_STAGE1_TTFT = _Metric("mtproxy_stage1_ttft_seconds", "Stage-1 (llama.cpp) time to first streamed byte", "histogram", ("mode",), _LATENCY_BUCKETS)
+M_STAGE1_TOTAL = _Metric("mtproxy_stage1_duration_seconds", "Stage-1 (llama.cpp) total stream time", "histogram", ("mode",), _LATENCY_BUCKETS)
+M_STAGE2_TTFT = _Metric("mtproxy_stage2_ttft_seconds", "Stage-2 (Ollama) time to first token", "histogram", ("call",), _LATENCY_BUCKETS)
+M_STAGE2_TOTAL = _Metric("mtproxy_stage2_duration_seconds", "Stage-2 (Ollama) total stream time", "histogram", ("call",), _LATENCY_BUCKETS)
+M_TOKENS_PER_S = _Metric("mtproxy_upstream_tokens_per_second", "Generation rate after the first token (stream deltas/s)", "histogram", ("upstream",), _TPS_BUCKETS)
+M_CONSOLIDATOR = _Metric("mtproxy_consolidator_duration_seconds", "Background context consolidation run time", "histogram", ("pass",), _LATENCY_BUCKETS)
+M_STREAM_BYTES = _Metric("mtproxy_response_bytes", "Bytes streamed to the client per response", "histogram", ("endpoint",), _BYTES_BUCKETS)
+M_CANNED = _Metric("mtproxy_stage1_canned_total", "Stage-1 canned fast-path replies (no llama.cpp call)", "counter", ("cls",))
+M_UPSTREAM_ERRORS = _Metric("mtproxy_upstream_errors_total", "Upstream failures ([stage1_http_error], [ollama_error], HTTP errors)", "counter", ("upstream", "kind"))
+M_TRUNCATIONS = _Metric("mtproxy_truncations_total", "Inputs/outputs cut at a configured cap", "counter", ("limit",))
+M_STAGE2_HEDGES = _Metric("mtproxy_stage2_hedges_total", "Hedged stage-2 requests by outcome", "counter", ("outcome",))
+M_ADMISSION_WAIT = _Metric("mtproxy_admission_wait_seconds", "Time spent queued for an upstream slot", "histogram", ("upstream", "priority"), _LATENCY_BUCKETS)
+M_PREEMPTIONS = _Metric("mtproxy_preemptions_total", "Streams cancelled by a newer request with the same preempt key", "counter", ("endpoint",))
+M_ADMISSION_SHED = _Metric("mtproxy_admission_shed_total", "Requests shed by admission control", "counter", ("upstream", "priority", "reason"))
+
+METRICS = (
+    M_STAGE1_TTFT,
+    M_STAGE1_TOTAL,
+    M_STAGE2_TTFT,
+    M_STAGE2_TOTAL,
+    M_TOKENS_PER_S,
+    M_CONSOLIDATOR,
+    M_STREAM_BYTES,
+    M_CANNED,
+    M_UPSTREAM_ERRORS,
+    M_TRUNCATIONS,
+    M_STAGE2_HEDGES,
+    M_ADMISSION_WAIT,
+    M_ADMISSION_SHED,
+    M_PREEMPTIONS,
+)
+
+
+def observe_generation(upstream: str, n_tokens: int, first_at: float, end_at: float):
+    if n_tokens > 1 and end_at > first_at:
+        M_TOKENS_PER_S.observe((n_tokens - 1) / (end_at - first_at), upstream)
+
+
+def _gauge_lines(name: str, help_text: str, value) -> list:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_prom_num(value)}"]
+
+
+def render_metrics() -> str:
+    with METRICS_LOCK:
+        lines = [ln for m in METRICS for ln in m.render()]
+    lines += _gauge_lines("mtproxy_interactive_streams", "Client-facing streams in progress", INTERACTIVE_ACTIVE["streams"])
+    lines += _gauge_lines("mtproxy_consolidator_queue_depth", "Sessions waiting for consolidation", len(CONSOLIDATOR._pending))
+    for name, help_text, fn in (
+        ("mtproxy_admission_in_flight", "Upstream slots in use", lambda g: g.in_use),
+        ("mtproxy_admission_queue_depth", "Requests waiting for an upstream slot", lambda g: g.depth()),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for g in ADMISSION_GATES.values():
+            lines.append(f'{name}{{upstream="{g.name}"}} {_prom_num(fn(g))}')
+    if STAGE1_POOL.pooled:
+        now = time.monotonic()
+        for name, help_text, fn in (
+            ("mtproxy_stage1_backend_outstanding", "Stage-1 requests in flight per llama.cpp backend", lambda b: b.outstanding),
+            ("mtproxy_stage1_backend_up", "1 if the stage-1 backend is in rotation", lambda b: int(b.available(now))),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for b in STAGE1_POOL.backends:
+                lines.append(f'{name}{{backend="{_prom_escape(b.url)}"}} {_prom_num(fn(b))}')
+    for k in ("hits", "misses"):
+        lines += [f"# HELP mtproxy_cache_{k}_total Response/draft cache {k}", f"# TYPE mtproxy_cache_{k}_total counter"]
+        for name, cache in (("response", RESPONSE_CACHE), ("draft", DRAFT_CACHE)):
+            lines.append(f'mtproxy_cache_{k}_total{{cache="{name}"}} {cache.stats[k]}')
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# ⏱️ Per-request timings (request id, JSON log record, in-band trailer)
+# =========================
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+_REQ_TIMINGS = contextvars.ContextVar("req_timings", default=None)
+
+
+class RequestTimings:
+    # Collected through a ContextVar so stage-1/stage-2 helpers (and the tasks they spawn) can record
+    # into the current request without threading an extra argument through every call.
+    # Stage fields are durations in ms; *_at_ms fields are offsets from request start.
+    def __init__(self, endpoint: str, request_id: str = ""):
+        rid = (request_id or "").strip()
+        self.request_id = rid if _REQUEST_ID_RE.match(rid) else uuid.uuid4().hex[:16]
+        self.t0 = time.perf_counter()
+        self.fields = {"request_id": self.request_id, "endpoint": endpoint}
+
+    def since_ms(self) -> float:
+        return round((time.perf_counter() - self.t0) * 1000.0, 1)
+
+    def set(self, **kw):
+        self.fields.update(kw)
+
+    def record(self) -> dict:
+        return dict(self.fields)
+
+    def headers(self) -> dict:
+        st = [f"parse;dur={self.fields.get('parse_ms', 0.0)}"]
+        if "cache" in self.fields:
+            st.append(f'cache;desc="{self.fields["cache"]}"')
+        return {"X-Request-ID": self.request_id, "Server-Timing": ", ".join(st)}
+
+
+def start_request_timings(req: Request, endpoint: str) -> RequestTimings:
+    rt = RequestTimings(endpoint, req.headers.get("x-request-id", ""))
+    _REQ_TIMINGS.set(rt)
+    return rt
+
+
+def timing_set(**kw):
+    rt = _REQ_TIMINGS.get()
+    if rt is not None:
+        rt.set(**kw)
+
+
+def timing_offset_ms() -> Optional[float]:
+    rt = _REQ_TIMINGS.get()
+    return rt.since_ms() if rt is not None else None
+
+
+async def timed_stream(gen: AsyncIterator[bytes], rt: RequestTimings, trailer: bool) -> AsyncIterator[bytes]:
+    # Outermost per-request layer (outside cache/single-flight), so replays and coalesced
+    # followers get their own request id and trailer instead of the leader's.
+    outcome = "ok"
+    n_bytes = 0
+    try:
+        async for ch in gen:
+            if not n_bytes:
+                rt.set(ttfb_ms=rt.since_ms())
+            n_bytes += len(ch)
+            yield ch
+        rt.set(total_ms=rt.since_ms(), bytes=n_bytes)
+        if trailer:
+            yield ("\n[timings] " + json.dumps(rt.record(), ensure_ascii=False) + "\n").encode("utf-8")
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        await gen.aclose()
+        if TIMING_LOG_ENABLED:
+            rec = rt.record()
+            rec.setdefault("total_ms", rt.since_ms())
+            rec.setdefault("bytes", n_bytes)
+            rec["outcome"] = "preempted" if outcome == "ok" and "preempted_by" in rec else outcome
+            log.info("[timing] %s", json.dumps(rec, ensure_ascii=False))
+
+
+# =========================
+# 📡 Event-stream responses (NDJSON / SSE)
+# =========================
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+# whole-line markers of the text protocol -> (event type, stage); prefixes carry a payload on the line
+_EVENT_MARKERS = {
+    "[stage1]": ("stage_start", "stage1"),
+    "[stage1_done]": ("stage_done", "stage1"),
+    "[stage2]": ("stage_start", "stage2"),
+}
+_EVENT_PREFIXES = {
+    "[stage1_timings] ": ("timings", "stage1"),
+    "[timings] ": ("timings", "request"),
+    "[stage1_error] ": ("error", "stage1"),
+    "[stage1_http_error] ": ("error", "stage1"),
+    "[ollama_error] ": ("error", "stage2"),
+    "[preempted] ": ("preempted", ""),
+}
+_EVENT_KEYS = tuple(_EVENT_MARKERS) + tuple(_EVENT_PREFIXES)
+
+
+def resolve_stream_format(value: Optional[str]) -> str:
+    f = (value or STREAM_FORMAT_DEFAULT or "text").strip().lower()
+    return f if f in STREAM_FORMATS else "text"
+
+
+class MarkerParser:
+    # Incremental text-protocol -> events. Markers only count as whole lines, so a line is held
+    # back only while it can still turn into one; everything else goes out as a delta right away.
+    # Newlines right before a marker are framing and dropped. Works on any chunking (live
+    # stream, coalesced replay, or a cached body in one piece).
+    def __init__(self):
+        self._line = ""
+        self._line_emitted = False
+        self._nl = 0  # newlines held until we know they're content, not framing
+
+    @staticmethod
+    def _maybe_marker(s: str) -> bool:
+        return any(k.startswith(s) or (k.endswith(" ") and s.startswith(k)) for k in _EVENT_KEYS)
+
+    @staticmethod
+    def _match(s: str):
+        if s in _EVENT_MARKERS:
+            kind, stage = _EVENT_MARKERS[s]
+            return {"type": kind, "stage": stage}
+        for k, (kind, stage) in _EVENT_PREFIXES.items():
+            if s.startswith(k):
+                rest = s[len(k):].strip()
+                if kind == "error":
+                    return {"type": "error", "stage": stage, "message": rest}
+                if kind == "preempted":
+                    return {"type": "preempted", "by": rest}
+                try:
+                    return {"type": "timings", "scope": stage, "data": json.loads(rest)}
+                except Exception:
+                    return None
+        return None
+
+    def _delta(self, text: str, out: list):
+        if text or self._nl:
+            out.append({"type": "delta", "text": "\n" * self._nl + text})
+            self._nl = 0
+
+    def feed(self, text: str) -> list:
+        out = []
+        parts = text.split("\n")
+        for i, part in enumerate(parts):
+            if self._line_emitted:
+                if part:
+                    self._delta(part, out)
+            else:
+                self._line += part
+                if self._line and not self._maybe_marker(self._line):
+                    self._delta(self._line, out)
+                    self._line, self._line_emitted = "", True
+            if i == len(parts) - 1:
+                break
+            # end of line
+            if self._line_emitted:
+                self._nl += 1
+            elif self._line:
+                ev = self._match(self._line)
+                if ev is not None:
+                    self._nl = 0
+                    out.append(ev)
+                else:
+                    self._delta(self._line, out)
+                    self._nl = 1
+            else:
+                self._nl += 1
+            self._line, self._line_emitted = "", False
+        return out
+
+    def finish(self) -> list:
+        out = []
+        if self._line:
+            ev = self._match(self._line)
+            if ev is not None:
+                out.append(ev)
+            else:
+                self._nl = 0
+                self._delta(self._line, out)
+        self._line = ""
+        return out
+
+
+def _encode_event(ev: dict, fmt: str) -> bytes:
+    data = json.dumps(ev, ensure_ascii=False)
+    if fmt == "sse":
+        return f"event: {ev['type']}\ndata: {data}\n\n".encode("utf-8")
+    return (data + "\n").encode("utf-8")
+
+
+async def event_stream(
+    gen: AsyncIterator[bytes],
+    fmt: str,
+    initial_stage: str,
+    rt: Optional[RequestTimings] = None,
+    tags: Optional[dict] = None,
+) -> AsyncIterator[bytes]:
+    # Re-frames a text-protocol stream as typed events: start, stage_start/delta/stage_done,
+    # error, timings, final. Token deltas are batched for EVENT_FLUSH_MS / EVENT_FLUSH_MAX_BYTES.
+    # tags: extra fields on every event (e.g. {"mode": ...} when streams are multiplexed)
+    # A "preempted" event is terminal: no closing stage_done/final is made up for the cut-off stage.
+    parser = MarkerParser()
+    stage = None
+    preempted = False
+    done = set()
+    texts = {}
+    batch = []
+    batch_bytes = 0
+    batch_since = 0.0
+    flush_s = max(EVENT_FLUSH_MS, 0) / 1000.0
+    nxt = None
+
+    def _enc(ev: dict, fmt: str) -> bytes:
+        return _encode_event({**ev, **tags} if tags else ev, fmt)
+
+    def _flush() -> bytes:
+        nonlocal batch, batch_bytes
+        if not batch:
+            return b""
+        ev = {"type": "delta", "stage": stage, "text": "".join(batch)}
+        batch, batch_bytes = [], 0
+        return _enc(ev, fmt)
+
+    def _close_stage() -> bytes:
+        if stage is None or stage in done:
+            return b""
+        done.add(stage)
+        return _enc({"type": "stage_done", "stage": stage}, fmt)
+
+    def _handle(evs: list) -> bytes:
+        nonlocal stage, preempted, batch_bytes, batch_since
+        out = []
+        for ev in evs:
+            if ev["type"] == "delta":
+                if stage is None:
+                    stage = initial_stage
+                    out.append(_enc({"type": "stage_start", "stage": stage}, fmt))
+                if not batch:
+                    batch_since = time.monotonic()
+                batch.append(ev["text"])
+                texts.setdefault(stage, []).append(ev["text"])
+                batch_bytes += len(ev["text"])
+                if flush_s <= 0 or batch_bytes >= EVENT_FLUSH_MAX_BYTES:
+                    out.append(_flush())
+                continue
+            out.append(_flush())
+            if ev["type"] == "stage_start":
+                if stage is not None and stage != ev["stage"] and stage not in done:
+                    done.add(stage)
+                    out.append(_enc({"type": "stage_done", "stage": stage}, fmt))
+                stage = ev["stage"]
+            elif ev["type"] == "stage_done":
+                done.add(ev["stage"])
+            elif ev["type"] == "preempted":
+                preempted = True
+            elif ev["type"] == "timings" and ev.get("scope") == "request" and not preempted:
+                # the request trailer comes after the body: close the open stage first
+                out.append(_close_stage())
+            out.append(_enc(ev, fmt))
+        return b"".join(out)
+
+    start = {"type": "start", "format": fmt}
+    if rt is not None:
+        start.update(request_id=rt.request_id, cache=rt.fields.get("cache"))
+    yield _enc(start, fmt)
+    try:
+        it = gen.__aiter__()
+        while True:
+            if nxt is None:
+                nxt = asyncio.ensure_future(it.__anext__())
+            timeout = None
+            if batch and flush_s > 0:
+                timeout = max(batch_since + flush_s - time.monotonic(), 0.0)
+            done_set, _ = await asyncio.wait({nxt}, timeout=timeout)
+            if not done_set:
+                b = _flush()
+                if b:
+                    yield b
+                continue
+            try:
+                chunk = nxt.result()
+            except StopAsyncIteration:
+                nxt = None
+                break
+            nxt = None
+            b = _handle(parser.feed(_to_str(chunk)))
+            if b:
+                yield b
+        tail = _handle(parser.finish()) + _flush()
+        if preempted:
+            if tail:
+                yield tail
+            return
+        tail += _close_stage()
+        final_stage = stage or initial_stage
+        final = {"type": "final", "stage": final_stage, "text": "".join(texts.get(final_stage, [])).strip()}
+        if rt is not None:
+            final["request_id"] = rt.request_id
+        yield tail + _enc(final, fmt)
+    finally:
+        if nxt is not None and not nxt.done():
+            nxt.cancel()
+            try:
+                await nxt
+            except BaseException:
+                pass
+        await gen.aclose()
+
+
+def framed_stream(gen: AsyncIterator[bytes], rt: RequestTimings, trailer: bool, fmt: str, initial_stage: str, claim=None):
+    # -> (body generator, media type); the event layer sits outside timed_stream so the
+    # [timings] trailer (when requested) becomes a "timings" event like any other marker
+    if claim is not None:
+        gen = preemptible(gen, claim)
+    gen = timed_stream(gen, rt, trailer)
+    if fmt not in STREAM_FORMATS:
+        return gen, "text/plain; charset=utf-8"
+    return event_stream(gen, fmt, initial_stage, rt), STREAM_FORMATS[fmt]
+
+
+@asynccontextmanager
+async def _lifespan(_app):
+    PROMPT_WATCHER.start()
+    CONSOLIDATOR.start()
+    WARMUP.start()
+    STAGE1_POOL.start()
+    yield
+    await STAGE1_POOL.stop()
+    await WARMUP.stop()
+    await CONSOLIDATOR.stop()
+    PROMPT_WATCHER.stop()
+    await close_upstream_clients()
+
+
 # =========================
 # 🚀 APP
 # =========================
-app = FastAPI(title="MT Chain Proxy (llama.cpp -> 120b)")
+app = FastAPI(title="MT Chain Proxy (llama.cpp -> 120b)", lifespan=_lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing", "X-Cache"],
 )
 
 # =========================
@@ -466,8 +1269,18 @@ async def api_key_guard(request: Request, call_next):
 # =========================
 # 📦 MODELS
 # =========================
+# session ids become dict keys, llama.cpp slot hashes and log fields: keep them short and plain
+SESSION_ID_PATTERN = r"^(?:[A-Za-z0-9_.:-]{1,128})?$"  # "" = the default session
+
+
 class AskRequest(BaseModel):
-    prompt: str = Field(..., description="Prompt text")
+    prompt: str = Field("", description="Prompt text (optional when session_id points at an ingested transcript)")
+    session_id: Optional[str] = Field(
+        None,
+        max_length=128,
+        pattern=SESSION_ID_PATTERN,
+        description="Meeting id fed via POST /sessions/{id}/lines (1-128 chars: A-Z a-z 0-9 _ . : -)",
+    )
     # stage-1 params (llama.cpp)
     n_predict: Optional[int] = Field(None, ge=1, le=32768)
     temperature: Optional[float] = Field(None, ge=0.0, le=2.0)
@@ -479,6 +1292,27 @@ class AskRequest(BaseModel):
         description="If true, streams stage-1 (8B) before stage-2 (120B)",
     )
     route: Optional[str] = Field(None, description="Compat: send 'negative'/'positive' to force mood")
+    no_cache: bool = Field(False, description="If true, skip the response cache lookup (the fresh answer is still stored)")
+    report_timings: bool = Field(
+        False,
+        description=(
+            "If true, add a [stage1_timings] line (llama.cpp prefill stats) and a final [timings] request "
+            "trailer; ndjson/sse get them as 'timings' events. TIMING_TRAILER_DEFAULT=1 turns the trailer on for every request"
+        ),
+    )
+    stream_format: Optional[str] = Field(
+        None,
+        description="'text' (default: plain text + [stage] marker lines), 'ndjson' or 'sse' (typed JSON events)",
+    )
+    overlap: bool = Field(
+        STAGE2_OVERLAP_DEFAULT,
+        description="If true, stage-2 starts as soon as the stage-1 draft is good enough (or after a deadline)",
+    )
+    preempt: bool = Field(
+        PREEMPT_DEFAULT,
+        description="If true, a newer request with the same preempt_key on this endpoint cancels this one",
+    )
+    preempt_key: Optional[str] = Field(None, description="Latest-wins key (defaults to session_id; without either, no preemption)")
 
 
 # =========================
@@ -557,22 +1391,31 @@ def _is_bye_only(text: str) -> bool:
     return bool(_BYE_ONLY_RE.match(text or ""))
 
 
-def _stage1_canned(author: str, speech: str, mode: str) -> str:
-    lang = _hint_lang_from_text(speech)
+def _canned_class(speech: str) -> str:
+    if _is_greetish_only(speech):
+        return "greet"
+    if _is_thanks_only(speech):
+        return "thanks"
+    if _is_bye_only(speech):
+        return "bye"
+    return ""
+
+
+def _canned_reply(author: str, lang: str, cls: str, mode: str) -> str:
     a = (author or "Interviewer").strip() or "Interviewer"
     m = (mode or "positivo").strip().lower()
 
-    if _is_greetish_only(speech):
+    if cls == "greet":
         if lang == "pt":
             return f"{a}, oi! Estou bem, obrigado." if m == "positivo" else f"{a}, oi. Estou bem."
         return f"{a}, hi! I'm doing well, thanks." if m == "positivo" else f"{a}, hi. I'm doing well."
 
-    if _is_thanks_only(speech):
+    if cls == "thanks":
         if lang == "pt":
             return f"{a}, de nada. Estou à disposição." if m == "positivo" else f"{a}, de nada."
         return f"{a}, you're welcome. Happy to help." if m == "positivo" else f"{a}, you're welcome."
 
-    if _is_bye_only(speech):
+    if cls == "bye":
         if lang == "pt":
             return f"{a}, fechado. Até mais." if m == "positivo" else f"{a}, certo. Até."
         return f"{a}, sounds good. Talk soon." if m == "positivo" else f"{a}, okay. Take care."
@@ -580,6 +1423,10 @@ def _stage1_canned(author: str, speech: str, mode: str) -> str:
     return ""
 
 
+def _stage1_canned(author: str, speech: str, mode: str) -> str:
+    return _canned_reply(author, _hint_lang_from_text(speech), _canned_class(speech), mode)
+
+
 # =========================
 # 🧠 Parser + Noise/Code filters
 # =========================
@@ -694,7 +1541,20 @@ def _is_ignored_line(ln: str) -> bool:
     return False
 
 
+def _valid_message(ln: str):
+    p = parse_line_author_and_text(ln)
+    if not p:
+        return None
+    if FILTER_NOISE and is_noise_text(p["text"]):
+        return None
+    if is_code_like(p["text"]):
+        return None
+    return p
+
+
 def extract_last_valid(raw: str):
+    # Single reverse pass. An "Interviewer:"/"Entrevistador:" line wins over any later speaker,
+    # so we only keep walking past the first valid line when such a line can still exist.
     raw = raw or ""
 
     p_inline = _parse_teams_inline(raw.strip())
@@ -706,40 +1566,77 @@ def extract_last_valid(raw: str):
         else:
             return p_inline
 
-    lines_all = [ln.strip() for ln in raw.splitlines() if ln and ln.strip()]
-    lines = [ln for ln in lines_all if not _is_ignored_line(ln)]
-
-    for ln in reversed(lines):
-        if _INTERVIEWER_PREFIX_RE.match(ln):
-            p = parse_line_author_and_text(ln)
-            if p and not (FILTER_NOISE and is_noise_text(p["text"])) and not is_code_like(p["text"]):
-                return p
-
-    for ln in reversed(lines):
-        p = parse_line_author_and_text(ln)
-        if not p:
+    # plain substring test: an IGNORECASE regex alternation over 20k chars costs ~40x more
+    low = raw.lower()
+    may_have_interviewer = "interviewer" in low or "entrevistador" in low
+    fallback = None
+    for ln in reversed(raw.splitlines()):
+        s = ln.strip()
+        if not s or _is_ignored_line(s):
             continue
-        if FILTER_NOISE and is_noise_text(p["text"]):
+        is_interviewer = may_have_interviewer and _INTERVIEWER_PREFIX_RE.match(s) is not None
+        if fallback is not None and not is_interviewer:
             continue
-        if is_code_like(p["text"]):
+        p = _valid_message(s)
+        if not p:
             continue
-        return p
+        if is_interviewer or not may_have_interviewer:
+            return p
+        fallback = p
+
+    return fallback
 
-    return None
 
+class ParsedPrompt(NamedTuple):
+    # Parsed once per request; every builder reads from it instead of re-scanning the transcript.
+    raw: str
+    found: bool
+    author: str  # normalized ("Interviewer" for unknown/missing)
+    speech: str  # last valid speech, or the whole stripped prompt if nothing parsed
+    lang: str  # "pt" | "en"
+    canned: str  # "greet" | "thanks" | "bye" | ""
+    code_like: bool
+    noise: bool
 
-def build_profile_user_text(raw_prompt: str, draft: str = "", context: str = "", mode: str = "positivo") -> str:
-    last = extract_last_valid(raw_prompt)
+
+def parse_prompt(raw_prompt: str) -> ParsedPrompt:
+    raw_prompt = raw_prompt or ""
+    return _parsed_from_last(raw_prompt, extract_last_valid(raw_prompt))
+
+
+def _parsed_from_last(raw_prompt: str, last) -> ParsedPrompt:
     if not last:
         author = "Interviewer"
-        speech = (raw_prompt or "").strip()
+        speech = raw_prompt.strip()
     else:
-        author = (last.get("author") or "").strip() or "Interviewer"
+        author = (last.get("author") or "Interviewer").strip() or "Interviewer"
         speech = (last.get("text") or "").strip()
-
     if author.lower() in ("unknown", "desconhecido"):
         author = "Interviewer"
-    if is_code_like(speech):
+    code_like = is_code_like(speech)
+    return ParsedPrompt(
+        raw=raw_prompt,
+        found=bool(last),
+        author=author,
+        speech=speech,
+        lang=_hint_lang_from_text(speech),
+        canned="" if code_like else _canned_class(speech),
+        code_like=code_like,
+        noise=is_noise_text(speech),
+    )
+
+
+def build_profile_user_text(
+    raw_prompt: str,
+    draft: str = "",
+    context: str = "",
+    mode: str = "positivo",
+    parsed: Optional[ParsedPrompt] = None,
+) -> str:
+    pp = parsed or parse_prompt(raw_prompt)
+    author = pp.author
+    speech = pp.speech
+    if pp.code_like:
         speech = "No clear spoken interview question found in the input."
     if len(speech) > 900:
         speech = speech[:900].rstrip() + "…"
@@ -766,18 +1663,11 @@ def build_profile_user_text(raw_prompt: str, draft: str = "", context: str = "",
     return out.strip()
 
 
-def build_stage1_user_text(raw_prompt: str, mode: str) -> Tuple[str, str, str]:
-    last = extract_last_valid(raw_prompt)
-    if not last:
-        author = "Interviewer"
-        speech = (raw_prompt or "").strip()
-    else:
-        author = (last.get("author") or "Interviewer").strip() or "Interviewer"
-        speech = (last.get("text") or "").strip()
-
-    if author.lower() in ("unknown", "desconhecido"):
-        author = "Interviewer"
-    if is_code_like(speech):
+def build_stage1_user_text(raw_prompt: str, mode: str, parsed: Optional[ParsedPrompt] = None) -> Tuple[str, str, str]:
+    pp = parsed or parse_prompt(raw_prompt)
+    author = pp.author
+    speech = pp.speech
+    if pp.code_like:
         speech = "No clear spoken interview question found."
 
     m = (mode or "positivo").strip().lower()
@@ -785,6 +1675,22 @@ def build_stage1_user_text(raw_prompt: str, mode: str) -> Tuple[str, str, str]:
     mood_tag = "NEGATIVE" if m == "negativo" else "POSITIVE"
     tc = time_context_line()
 
+    if STAGE1_STABLE_PREFIX:
+        # byte-stable head (persona + mood + rules), per-request data at the tail -> llama.cpp prefix reuse
+        return (
+            author,
+            speech,
+            (
+                "You are Leonel Dorneles Porto answering as a candidate in a technical interview.\n"
+                f"MOOD: {mood_tag}\n"
+                f"{rules}\n"
+                f"AUTHOR: {author}\n"
+                f"SPEECH: {speech}\n"
+                f"TIME: {tc}\n"
+                "Answer now:"
+            ).strip(),
+        )
+
     return (
         author,
         speech,
@@ -801,33 +1707,168 @@ def build_stage1_user_text(raw_prompt: str, mode: str) -> Tuple[str, str, str]:
 
 
 # =========================
-# 🧠 Context memory
+# 🧠 Context memory (per session)
 # =========================
-STATE_LOCK = threading.Lock()
-CLEAN_BUFFER = []
-CONTEXT_TEXT = ""
-LAST_CONTEXT_HASH = ""
-LAST_CONTEXT_AT = 0.0
-
+DEFAULT_SESSION_ID = "default"  # requests without session_id share this one (legacy behaviour)
+CONSOLIDATOR_WINDOW = 20
+
+
+class SessionState:
+    # One meeting: compact message ring (ts, author, text), consolidated context and the optional
+    # delta-ingested transcript. Each session has its own lock so seats on the same box don't contend.
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.lock = threading.Lock()
+        self.msgs = deque(maxlen=max(CLEAN_BUFFER_MAX, 1))
+        self._msg_bytes = 0
+        self.msg_seq = 0  # messages ever pushed
+        self.context_text = ""
+        self.context_seq = 0  # msg_seq covered by context_text
+        self.context_at = 0.0
+        self.incremental_since_full = 0
+        self.line_ctx = ""  # context digest when the trailing run of identical lines began
+        self.transcript = None  # TranscriptBuffer when fed via /sessions/{id}/lines
+        self.created_at = time.time()
+        self.touched_at = self.created_at
+
+    @staticmethod
+    def _msg_size(m) -> int:
+        return 72 + len(m[1]) + len(m[2])  # tuple + float overhead, roughly
+
+    def _is_last(self, author: str, text: str) -> bool:
+        return bool(self.msgs) and self.msgs[-1][1] == author and self.msgs[-1][2] == text
+
+    def push(self, author: str, text: str) -> bool:
+        with self.lock:
+            # a repeat is still a message (a speaker can say "yes" twice); only the context it
+            # was first asked against is kept for the response-cache key
+            if not self._is_last(author, text):
+                self.line_ctx = _digest(self.context_text)
+            if len(self.msgs) == self.msgs.maxlen:
+                self._msg_bytes -= self._msg_size(self.msgs[0])
+            m = (time.time(), author, text)
+            self.msgs.append(m)
+            self._msg_bytes += self._msg_size(m)
+            self.msg_seq += 1
+            return True
 
-def _hash_messages(msgs):
-    raw = "|".join([f'{m.get("author","")}:{m.get("text","")}' for m in msgs])
-    return hashlib.sha256(raw.encode("utf-8", errors="ignore")).hexdigest()
+    def recent(self, n: int) -> list:
+        with self.lock:
+            return list(self.msgs)[-n:] if n > 0 else []
+
+    def context(self) -> str:
+        with self.lock:
+            return self.context_text
+
+    def context_digest_for(self, author: str, text: str) -> str:
+        # response-cache view of the context as it will be once this line is pushed: a re-asked
+        # line keys on the context its first ask saw, even after consolidation folded the line in
+        with self.lock:
+            if self.line_ctx and self._is_last(author, text):
+                return self.line_ctx
+            return _digest(self.context_text)
+
+    def set_context(self, ctx: str, upto_seq: int, full: bool):
+        with self.lock:
+            self.context_text = ctx
+            self.context_seq = upto_seq
+            self.context_at = time.time()
+            self.incremental_since_full = 0 if full else self.incremental_since_full + 1
+
+    def approx_bytes(self) -> int:
+        with self.lock:
+            n = 256 + self._msg_bytes + len(self.context_text)
+        if self.transcript is not None:
+            n += self.transcript.chars + 64 * len(self.transcript.lines)
+        return n
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            out = {
+                "messages": len(self.msgs),
+                "context_len": len(self.context_text),
+                "context_at": self.context_at,
+                "idle_s": round(time.time() - self.touched_at, 1),
+            }
+        out["approx_bytes"] = self.approx_bytes()
+        if self.transcript is not None:
+            out["transcript"] = self.transcript.snapshot()
+        return out
+
+
+SESSIONS_LOCK = threading.Lock()  # guards the registry only; per-session state uses SessionState.lock
+SESSIONS = OrderedDict()  # session_id -> SessionState (LRU order)
+SESSION_EVICTIONS = {"idle": 0, "count": 0, "memory": 0}
+
+
+def _evict_sessions_locked(keep: str):
+    now = time.time()
+    for sid in [k for k, st in SESSIONS.items() if k != keep and now - st.touched_at > SESSION_IDLE_TTL_S]:
+        SESSIONS.pop(sid, None)
+        SESSION_EVICTIONS["idle"] += 1
+    while len(SESSIONS) > SESSIONS_MAX and next(iter(SESSIONS)) != keep:
+        SESSIONS.popitem(last=False)
+        SESSION_EVICTIONS["count"] += 1
+    if SESSIONS_MEMORY_MAX_BYTES > 0:
+        total = sum(st.approx_bytes() for st in SESSIONS.values())
+        while total > SESSIONS_MEMORY_MAX_BYTES and len(SESSIONS) > 1 and next(iter(SESSIONS)) != keep:
+            _sid, st = SESSIONS.popitem(last=False)
+            total -= st.approx_bytes()
+            SESSION_EVICTIONS["memory"] += 1
+
+
+def get_session(session_id: Optional[str], create: bool = True) -> Optional[SessionState]:
+    sid = (session_id or "").strip() or DEFAULT_SESSION_ID
+    with SESSIONS_LOCK:
+        st = SESSIONS.get(sid)
+        if st is None:
+            if not create:
+                return None
+            st = SessionState(sid)
+            SESSIONS[sid] = st
+        st.touched_at = time.time()
+        SESSIONS.move_to_end(sid)
+        _evict_sessions_locked(keep=sid)
+        return st
+
+
+def drop_session(session_id: str) -> bool:
+    with SESSIONS_LOCK:
+        return SESSIONS.pop(session_id, None) is not None
+
+
+def sessions_snapshot() -> dict:
+    with SESSIONS_LOCK:
+        items = list(SESSIONS.items())
+    per = {sid: st.snapshot() for sid, st in items}
+    return {
+        "count": len(per),
+        "max": SESSIONS_MAX,
+        "idle_ttl_s": SESSION_IDLE_TTL_S,
+        "memory_bytes": sum(v["approx_bytes"] for v in per.values()),
+        "memory_max_bytes": SESSIONS_MEMORY_MAX_BYTES,
+        "transcript_max_chars": SESSION_TRANSCRIPT_MAX_CHARS,
+        "evictions": dict(SESSION_EVICTIONS),
+        "per_session": per,
+    }
 
 
-def push_clean_message(author: str, text: str, max_keep: int = 60):
-    with STATE_LOCK:
-        CLEAN_BUFFER.append({"ts": time.time(), "author": author, "text": text})
-        if len(CLEAN_BUFFER) > max_keep:
-            del CLEAN_BUFFER[:-max_keep]
+def push_clean_message(author: str, text: str, session_id: Optional[str] = None) -> bool:
+    return get_session(session_id).push(author, text)
 
 
 def build_consolidator_input(msgs):
-    s = " | ".join([f'{m["author"]}: {m["text"]}' for m in msgs])
+    s = " | ".join([f"{m[1]}: {m[2]}" for m in msgs])
     return f"MESSAGES={s}"
 
 
-def call_ollama_sync(system_prompt: str, user_text: str, options: dict) -> str:
+def build_incremental_consolidator_input(previous_context: str, new_msgs):
+    s = " | ".join([f"{m[1]}: {m[2]}" for m in new_msgs])
+    prev = (previous_context or "").replace("\r", " ").strip()
+    return f"PREVIOUS_CONTEXT={prev}; NEW_MESSAGES={s}"
+
+
+async def call_ollama_once(system_prompt: str, user_text: str, options: dict, priority: str = "background") -> str:
     payload = {
         "model": MODEL,
         "stream": False,
@@ -837,53 +1878,1023 @@ def call_ollama_sync(system_prompt: str, user_text: str, options: dict) -> str:
         ],
         "options": options,
     }
-    r = requests.post(OLLAMA_URL, json=payload, timeout=(CONNECT_TIMEOUT, TIMEOUT))
-    r.raise_for_status()
-    data = r.json()
+    if OLLAMA_KEEP_ALIVE:
+        payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+    gate = ADMISSION_GATES["stage2"]
+    ticket = await gate.acquire(priority)
+    try:
+        r = await get_upstream_client("stage2").post(OLLAMA_URL, json=payload)
+        r.raise_for_status()
+        data = r.json()
+    except Exception:
+        M_UPSTREAM_ERRORS.inc("stage2", "http")
+        raise
+    finally:
+        gate.release(ticket)
+    WARMUP.touch("stage2")
     out = ((data.get("message") or {}).get("content")) or ""
     return out.replace("\r", " ").replace("\n", " ").strip()
 
 
-def refresh_context_sync():
-    global CONTEXT_TEXT, LAST_CONTEXT_HASH, LAST_CONTEXT_AT
-    with STATE_LOCK:
-        msgs = CLEAN_BUFFER[-20:]
-        current_ctx = CONTEXT_TEXT
-        current_hash = LAST_CONTEXT_HASH
+async def refresh_context(session_id: Optional[str] = None) -> str:
+    # Incremental by default: previous summary + messages since it was written. A full pass over the
+    # last CONSOLIDATOR_WINDOW messages runs when there is no summary yet, when too many messages
+    # arrived at once, or every CONSOLIDATOR_FULL_EVERY incremental runs (keeps drift in check).
+    st = get_session(session_id)
+    with st.lock:
+        msgs = list(st.msgs)[-CONSOLIDATOR_WINDOW:]
+        seq = st.msg_seq
+        current_ctx = st.context_text
+        ctx_seq = st.context_seq
+        n_incremental = st.incremental_since_full
     if not msgs:
         return ""
-    h = _hash_messages(msgs)
-    if h == current_hash and current_ctx:
+    if seq == ctx_seq and current_ctx:
         return current_ctx
-    ctx = call_ollama_sync(
+
+    n_new = seq - ctx_seq
+    full = (
+        not CONSOLIDATOR_INCREMENTAL
+        or not current_ctx
+        or n_new >= len(msgs)
+        or n_incremental >= max(CONSOLIDATOR_FULL_EVERY, 1)
+    )
+    if full:
+        user_text = build_consolidator_input(msgs)
+    else:
+        user_text = build_incremental_consolidator_input(current_ctx, msgs[-n_new:])
+
+    t0 = time.perf_counter()
+    ctx = await call_ollama_once(
         SYSTEM_PROMPT_CONSOLIDATOR(),
-        build_consolidator_input(msgs),
+        user_text,
         OPTIONS_CONSOLIDATOR,
     )
-    with STATE_LOCK:
-        CONTEXT_TEXT = ctx
-        LAST_CONTEXT_HASH = h
-        LAST_CONTEXT_AT = time.time()
-    return CONTEXT_TEXT
+    M_CONSOLIDATOR.observe(time.perf_counter() - t0, "full" if full else "incremental")
+    if CONSOLIDATOR_CONTEXT_MAX_CHARS > 0 and len(ctx) > CONSOLIDATOR_CONTEXT_MAX_CHARS:
+        ctx = ctx[:CONSOLIDATOR_CONTEXT_MAX_CHARS].rstrip() + "…"
+    st.set_context(ctx, seq, full)
+
+    stats = CONSOLIDATOR.stats
+    stats["full_runs" if full else "incremental_runs"] += 1
+    stats["input_chars_total"] += len(user_text)
+    stats["input_chars_last"] = len(user_text)
+    return ctx
+
+
+# =========================
+# ⏳ Consolidator worker (debounced, single-flight per session, low priority)
+# =========================
+INTERACTIVE_ACTIVE = {"streams": 0}  # client-facing streams in progress (see guard_disconnect)
+
+
+class ConsolidatorWorker:
+    # Triggers for a session within CONSOLIDATOR_DEBOUNCE_MS collapse into one run (bounded by
+    # CONSOLIDATOR_MAX_DELAY_MS). A session never has two runs at once, and a run waits (up to
+    # CONSOLIDATOR_MAX_DEFER_MS) for interactive streams to drain before it hits the 120b upstream.
+    def __init__(self):
+        self._pending = {}  # session_id -> [first_trigger_at, due_at]
+        self._running = set()
+        self._wake = None
+        self._task = None
+        self.stats = {
+            "triggers": 0,
+            "coalesced": 0,
+            "runs": 0,
+            "failures": 0,
+            "deferred_ms_total": 0.0,
+            "last_run_ms": 0.0,
+            "max_run_ms": 0.0,
+            "total_run_ms": 0.0,
+            "full_runs": 0,
+            "incremental_runs": 0,
+            "input_chars_total": 0,
+            "input_chars_last": 0,
+        }
+
+    def trigger(self, session_id: str):
+        now = time.monotonic()
+        debounce_s = max(CONSOLIDATOR_DEBOUNCE_MS, 0) / 1000.0
+        p = self._pending.get(session_id)
+        if p is not None:
+            p[1] = min(now + debounce_s, p[0] + max(CONSOLIDATOR_MAX_DELAY_MS, 0) / 1000.0)
+            self.stats["coalesced"] += 1
+        else:
+            self._pending[session_id] = [now, now + debounce_s]
+        self.stats["triggers"] += 1
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+            self._task = None
+
+    async def _yield_to_interactive(self):
+        t0 = time.monotonic()
+        deadline = t0 + max(CONSOLIDATOR_MAX_DEFER_MS, 0) / 1000.0
+        while INTERACTIVE_ACTIVE["streams"] > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self.stats["deferred_ms_total"] += (time.monotonic() - t0) * 1000.0
+
+    async def _loop(self):
+        while True:
+            now = time.monotonic()
+            waiting = {sid: p for sid, p in self._pending.items() if sid not in self._running}
+            ready = [sid for sid, p in waiting.items() if p[1] <= now]
+            slots = max(CONSOLIDATOR_CONCURRENCY, 1) - len(self._running)
+            if ready and slots > 0:
+                await self._yield_to_interactive()
+                for sid in ready[:slots]:
+                    if sid in self._running or self._pending.pop(sid, None) is None:
+                        continue
+                    self._running.add(sid)
+                    asyncio.create_task(self._run(sid))
+                continue
+            timeout = None
+            if waiting and slots > 0:
+                timeout = max(min(p[1] for p in waiting.values()) - now, 0.0)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, session_id: str):
+        t0 = time.perf_counter()
+        try:
+            ctx = await refresh_context(session_id)
+            if ctx:
+                st = get_session(session_id)
+                log.info("[context] session=%s updated_at=%.0f ctx_preview=%r", st.session_id, st.context_at, ctx[:160])
+        except Exception as e:
+            self.stats["failures"] += 1
+            log.info("[context] failed: %s", e)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            self.stats["runs"] += 1
+            self.stats["last_run_ms"] = ms
+            self.stats["total_run_ms"] += ms
+            self.stats["max_run_ms"] = max(self.stats["max_run_ms"], ms)
+            self._running.discard(session_id)
+            self._wake.set()
+
+    def snapshot(self) -> dict:
+        runs = self.stats["runs"]
+        return {
+            "queue_depth": len(self._pending),
+            "running": len(self._running),
+            "debounce_ms": CONSOLIDATOR_DEBOUNCE_MS,
+            "max_delay_ms": CONSOLIDATOR_MAX_DELAY_MS,
+            "max_defer_ms": CONSOLIDATOR_MAX_DEFER_MS,
+            "concurrency": CONSOLIDATOR_CONCURRENCY,
+            "incremental": CONSOLIDATOR_INCREMENTAL,
+            "full_every": CONSOLIDATOR_FULL_EVERY,
+            "avg_run_ms": round(self.stats["total_run_ms"] / runs, 1) if runs else 0.0,
+            **{k: (round(v, 1) if isinstance(v, float) else v) for k, v in self.stats.items()},
+        }
+
+
+CONSOLIDATOR = ConsolidatorWorker()
+
+
+# =========================
+# 🔥 Warm-up / keep-alive (llama.cpp + Ollama)
+# =========================
+def _ollama_api_url(path: str) -> str:
+    # OLLAMA_URL points at /api/chat; sibling endpoints (/api/ps) live next to it
+    base = OLLAMA_URL.split("/api/", 1)[0] if "/api/" in OLLAMA_URL else OLLAMA_URL.rstrip("/")
+    return base + path
+
+
+def _ollama_is_cloud(name: str) -> bool:
+    return str(name or "").endswith("-cloud")
+
+
+def _ollama_model_tag(name) -> str:
+    # Ollama reports "llama3" as "llama3:latest"; the tag colon comes after any registry host:port
+    name = str(name or "").strip()
+    return name if ":" in name.rsplit("/", 1)[-1] else f"{name}:latest"
+
+
+class WarmupManager:
+    # Sends a 1-token generation to each upstream at startup and whenever a target has been idle for
+    # WARMUP_INTERVAL_S (real traffic counts as a warm-up; "-cloud" models are only warmed at startup
+    # or after an error). For Ollama, /api/ps is probed every
+    # WARMUP_CHECK_S so an evicted model is reloaded before the next /ask_me needs it.
+    def __init__(self):
+        self._task = None
+        self.targets = {}
+        if WARMUP_LLAMA:
+            self.targets["stage1"] = self._new_target(LLAMA_DEFAULT_URL)
+        if WARMUP_OLLAMA:
+            self.targets["stage2"] = self._new_target(OLLAMA_URL, model=MODEL)
+
+    @staticmethod
+    def _new_target(url: str, model: str = "") -> dict:
+        return {
+            "url": url,
+            "model": model,
+            "state": "cold",  # cold | warming | warm | evicted | error
+            "last_warm_at": 0.0,
+            "last_used_at": 0.0,
+            "last_used_mono": 0.0,
+            "warmups": 0,
+            "failures": 0,
+            "evictions": 0,
+            "cold_ttft_ms": None,  # last warm-up that found the target cold/evicted
+            "warm_ttft_ms": None,  # last warm-up that found it already loaded
+            "last_ttft_ms": None,
+            "last_error": "",
+        }
+
+    def touch(self, name: str):
+        t = self.targets.get(name)
+        if t is None:
+            return
+        t["last_used_at"] = time.time()
+        t["last_used_mono"] = time.monotonic()
+        if t["state"] != "warming":
+            t["state"] = "warm"
+
+    def start(self):
+        if not WARMUP_ENABLED or not self.targets:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        if WARMUP_ON_STARTUP:
+            await self.warm_all(reason="startup")
+        while True:
+            await asyncio.sleep(max(WARMUP_CHECK_S, 1.0))
+            try:
+                await self._check()
+            except Exception as e:
+                log.info("[warmup] check failed: %s", e)
+
+    async def _check(self):
+        if "stage2" in self.targets and await self._ollama_evicted():
+            t = self.targets["stage2"]
+            if t["state"] == "warm":
+                t["evictions"] += 1
+                t["state"] = "evicted"
+                log.info("[warmup] stage2 model=%s no longer loaded", MODEL)
+        now = time.monotonic()
+        for name, t in self.targets.items():
+            idle = now - t["last_used_mono"] if t["last_used_mono"] else None
+            due = t["state"] in ("cold", "evicted", "error") or (
+                self._rewarm_when_idle(name) and (idle is None or idle >= WARMUP_INTERVAL_S)
+            )
+            if due and INTERACTIVE_ACTIVE["streams"] == 0:
+                await self.warm(name, reason=t["state"] if t["state"] != "warm" else "idle")
+
+    @staticmethod
+    def _rewarm_when_idle(name: str) -> bool:
+        # a cloud model has no local residency to keep: idle re-warms would be paid calls for nothing
+        return not (name == "stage2" and _ollama_is_cloud(MODEL))
+
+    async def _ollama_evicted(self) -> bool:
+        # cloud models never show up in /api/ps; a failed probe is not treated as eviction
+        if _ollama_is_cloud(MODEL):
+            return False
+        try:
+            r = await get_upstream_client("stage2").get(_ollama_api_url("/api/ps"), timeout=5.0)
+            r.raise_for_status()
+            models = (r.json() or {}).get("models") or []
+        except Exception:
+            return False
+        names = {_ollama_model_tag(m.get(k)) for m in models for k in ("name", "model") if m.get(k)}
+        return _ollama_model_tag(MODEL) not in names
+
+    async def warm_all(self, reason: str = "manual"):
+        await asyncio.gather(*(self.warm(n, reason=reason) for n in list(self.targets)), return_exceptions=True)
+
+    async def warm(self, name: str, reason: str = "manual"):
+        t = self.targets.get(name)
+        if t is None or t["state"] == "warming":
+            return
+        was_cold = t["state"] != "warm"
+        t["state"] = "warming"
+        t0 = time.perf_counter()
+        try:
+            if name == "stage1":
+                await self._warm_llama()
+            else:
+                await self._warm_ollama()
+        except Exception as e:
+            t["state"] = "error"
+            t["failures"] += 1
+            t["last_error"] = _to_str(e)[:200]
+            log.info("[warmup] %s failed reason=%s: %s", name, reason, e)
+            return
+        ms = (time.perf_counter() - t0) * 1000.0
+        t["warmups"] += 1
+        t["last_ttft_ms"] = round(ms, 1)
+        t["cold_ttft_ms" if was_cold else "warm_ttft_ms"] = round(ms, 1)
+        t["last_warm_at"] = time.time()
+        t["last_error"] = ""
+        t["state"] = "warm"
+        self.touch(name)
+        log.info("[warmup] %s ok reason=%s ttft_ms=%.0f cold=%s", name, reason, ms, was_cold)
+
+    async def _warm_llama(self):
+        # same stable system prefix as real stage-1 calls, so cache_prompt keeps it resident
+        body = {
+            "prompt": build_llama3_chat_prompt(_with_profile(STAGE1_SYSTEM()), "Hi"),
+            "stream": False,
+            "n_predict": 1,
+            "cache_prompt": STAGE1_CACHE_PROMPT,
+        }
+        r = await get_upstream_client("stage1").post(LLAMA_DEFAULT_URL, json=body)
+        r.raise_for_status()
+
+    async def _warm_ollama(self):
+        payload = {
+            "model": MODEL,
+            "stream": False,
+            "messages": [{"role": "user", "content": "Hi"}],
+            "options": {"num_predict": 1},
+        }
+        if OLLAMA_KEEP_ALIVE:
+            payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+        r = await get_upstream_client("stage2").post(OLLAMA_URL, json=payload)
+        r.raise_for_status()
+        data = r.json()
+        if isinstance(data, dict) and data.get("error"):
+            raise RuntimeError(data["error"])
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": WARMUP_ENABLED,
+            "interval_s": WARMUP_INTERVAL_S,
+            "check_s": WARMUP_CHECK_S,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "targets": {n: {k: v for k, v in t.items() if k != "last_used_mono"} for n, t in self.targets.items()},
+        }
+
+
+WARMUP = WarmupManager()
+
+
+# =========================
+# 🔀 Stage 1 backend pool (llama.cpp)
+# =========================
+class Stage1Backend:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0  # monotonic end of the ejection window
+        self.needs_probe = False  # ejected while probing: stays out until a /health probe passes
+        self.probe_ok = None  # last /health result (None = not probed yet)
+        self.ewma_ttft_ms = None
+        self.last_error = ""
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now and not self.needs_probe
+
+    def health_url(self) -> str:
+        # llama-server answers GET /health (503 while the model is loading)
+        u = httpx.URL(self.url)
+        return str(u.copy_with(path="/health", query=None))
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "url": self.url,
+            "in_rotation": self.available(now),
+            "ejected_for_s": round(max(self.ejected_until - now, 0.0), 1),
+            "awaiting_probe": self.needs_probe,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+            "probe_ok": self.probe_ok,
+            "ewma_ttft_ms": None if self.ewma_ttft_ms is None else round(self.ewma_ttft_ms, 1),
+            "last_error": self.last_error,
+        }
+
+
+class Stage1Pool:
+    # Routes stage-1 drafts across LLAMA_URLS. A session sticks to its rendezvous-hash backend (so
+    # that server's prompt cache / id_slot stays warm) unless it is ejected or has
+    # LLAMA_POOL_STICKY_SLACK more requests in flight than the least busy one; otherwise the
+    # policy picks (least_outstanding, or latency = in-flight x EWMA TTFT).
+    # Backends are ejected after LLAMA_POOL_EJECT_FAILS consecutive failures (or a failed probe)
+    # and re-admitted once a /health probe passes after LLAMA_POOL_EJECT_S.
+    def __init__(self, urls: list):
+        self.backends = [Stage1Backend(u) for u in urls]
+        self._task = None
+        self.stats = {"picks": 0, "sticky_hits": 0, "spills": 0, "failovers": 0, "all_ejected": 0}
+
+    @property
+    def pooled(self) -> bool:
+        return len(self.backends) > 1
+
+    @staticmethod
+    def _hrw(key: str, url: str) -> int:
+        return int(hashlib.sha1(f"{key}|{url}".encode("utf-8")).hexdigest()[:12], 16)
+
+    def _score(self, b: Stage1Backend):
+        if LLAMA_POOL_POLICY == "latency" and b.ewma_ttft_ms is not None:
+            return ((b.outstanding + 1) * b.ewma_ttft_ms, b.requests)
+        return (b.outstanding, b.ewma_ttft_ms or 0.0, b.requests)
+
+    def pick(self, sticky_key: str = "", exclude=()) -> Stage1Backend:
+        now = time.monotonic()
+        cands = [b for b in self.backends if b.available(now) and b not in exclude]
+        if not cands:
+            # everything ejected: keep serving from the least recently failing backend
+            self.stats["all_ejected"] += 1
+            cands = [b for b in self.backends if b not in exclude] or self.backends
+            cands = [min(cands, key=lambda x: x.ejected_until)]
+        self.stats["picks"] += 1
+        best = min(cands, key=self._score)
+        if LLAMA_POOL_STICKY and sticky_key and len(cands) > 1:
+            home = max(cands, key=lambda x: self._hrw(sticky_key, x.url))
+            if home.outstanding - best.outstanding < LLAMA_POOL_STICKY_SLACK:
+                self.stats["sticky_hits"] += 1
+                return home
+            self.stats["spills"] += 1
+        return best
+
+    def begin(self, b: Stage1Backend):
+        b.outstanding += 1
+        b.requests += 1
+
+    def end(self, b: Stage1Backend, ok: Optional[bool], ttft_s: Optional[float] = None, error: str = ""):
+        # ok=None: the caller went away mid-attempt -> neither healthy nor failed, no latency sample
+        b.outstanding = max(b.outstanding - 1, 0)
+        if ok is None:
+            return
+        if ttft_s is not None:
+            ms = ttft_s * 1000.0
+            b.ewma_ttft_ms = ms if b.ewma_ttft_ms is None else 0.8 * b.ewma_ttft_ms + 0.2 * ms
+        if ok:
+            b.consecutive_failures = 0
+            return
+        b.failures += 1
+        b.consecutive_failures += 1
+        b.last_error = error[:200]
+        if self.pooled and b.consecutive_failures >= max(LLAMA_POOL_EJECT_FAILS, 1) and b.available(time.monotonic()):
+            self._eject(b, f"{b.consecutive_failures} consecutive failures")
+
+    def _eject(self, b: Stage1Backend, why: str):
+        b.ejected_until = time.monotonic() + LLAMA_POOL_EJECT_S
+        b.needs_probe = self._task is not None
+        b.ejections += 1
+        log.warning("[pool] ejected stage1 backend %s for %.0fs (%s)", b.url, LLAMA_POOL_EJECT_S, why)
+
+    def start(self):
+        if not self.pooled or LLAMA_POOL_PROBE_S <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        log.info("[pool] stage1 backends=%d policy=%s sticky=%s probe=%.0fs", len(self.backends), LLAMA_POOL_POLICY, LLAMA_POOL_STICKY, LLAMA_POOL_PROBE_S)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except BaseException:
+            pass
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.gather(*(self.probe(b) for b in self.backends))
+            except Exception as e:
+                log.warning("[pool] probe loop error: %s", e)
+            await asyncio.sleep(LLAMA_POOL_PROBE_S)
+
+    async def probe(self, b: Stage1Backend):
+        try:
+            r = await get_upstream_client("stage1").get(b.health_url(), timeout=min(STAGE1_CONNECT_TIMEOUT + 2.0, 5.0))
+            ok = r.status_code == 200
+            err = "" if ok else f"health HTTP {r.status_code}"
+        except Exception as e:
+            ok, err = False, _to_str(e) or type(e).__name__
+        b.probe_ok = ok
+        now = time.monotonic()
+        if ok:
+            if b.needs_probe and b.ejected_until <= now:
+                log.info("[pool] re-admitted stage1 backend %s", b.url)
+                b.needs_probe = False
+                b.consecutive_failures = 0
+            return
+        b.last_error = err[:200]
+        if b.available(now):
+            self._eject(b, err)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "backends": [b.snapshot(now) for b in self.backends],
+            "policy": LLAMA_POOL_POLICY,
+            "sticky": LLAMA_POOL_STICKY,
+            "sticky_slack": LLAMA_POOL_STICKY_SLACK,
+            "failover": LLAMA_POOL_FAILOVER,
+            "probe_s": LLAMA_POOL_PROBE_S,
+            **self.stats,
+        }
+
+
+STAGE1_POOL = Stage1Pool(LLAMA_URLS or [LLAMA_DEFAULT_URL])
+
+
+# =========================
+# 🚦 Admission control (per-upstream limits, priority queue, load shedding)
+# =========================
+PRIORITY_CLASSES = {"interactive": 0, "rewrite": 1, "background": 2}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, upstream: str, priority: str, reason: str, status: int, retry_after_s: float):
+        super().__init__(f"{upstream} overloaded ({reason}, priority={priority})")
+        self.upstream = upstream
+        self.priority = priority
+        self.reason = reason
+        self.status = status
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionGate:
+    # At most `limit` concurrent calls to one upstream. Callers over the limit wait in a priority
+    # queue (interactive > rewrite > background, FIFO within a class) and a freed slot is handed
+    # straight to the best waiter. Shedding: 429 when the queue is full, 503 when the predicted
+    # (EWMA hold time x position) or actual wait exceeds the class's ADMISSION_WAIT_MS.
+    def __init__(self, name: str, limit: int, queue_max: int):
+        self.name = name
+        self.limit = limit
+        self.queue_max = queue_max
+        self.in_use = 0
+        self._waiters = []  # heap of [priority, seq, future, class]
+        self._seq = 0
+        self.ewma_hold_s = None
+        self.stats = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_deadline": 0, "shed_timeout": 0, "max_depth": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return ADMISSION_ENABLED and self.limit > 0
+
+    def depth(self) -> int:
+        return sum(1 for w in self._waiters if not w[2].done())
+
+    def _retry_after(self, est_s: float) -> float:
+        return max(est_s, self.ewma_hold_s or 0.0, 1.0)
+
+    def check(self, priority: str) -> Optional[AdmissionRejected]:
+        # would a new request of this class be shed right now? (no side effects)
+        if not self.enabled or (self.in_use < self.limit and not self.depth()):
+            return None
+        live = [w for w in self._waiters if not w[2].done()]
+        if len(live) >= max(self.queue_max, 0):
+            est = (self.ewma_hold_s or 0.0) * (len(live) + 1) / self.limit
+            return AdmissionRejected(self.name, priority, "queue_full", 429, self._retry_after(est))
+        prio = PRIORITY_CLASSES[priority]
+        ahead = sum(1 for w in live if w[0] <= prio)
+        est = (self.ewma_hold_s or 0.0) * (ahead + 1) / self.limit
+        if est * 1000.0 > ADMISSION_WAIT_MS[priority]:
+            return AdmissionRejected(self.name, priority, "deadline", 503, self._retry_after(est))
+        return None
+
+    def _shed(self, e: AdmissionRejected) -> AdmissionRejected:
+        self.stats[f"shed_{e.reason}"] += 1
+        M_ADMISSION_SHED.inc(self.name, e.priority, e.reason)
+        log.info("[admission] shed upstream=%s priority=%s reason=%s in_use=%d depth=%d", self.name, e.priority, e.reason, self.in_use, self.depth())
+        return e
+
+    async def acquire(self, priority: str) -> Optional[float]:
+        # -> ticket for release(); None when admission is off for this upstream
+        if not self.enabled:
+            return None
+        t0 = time.perf_counter()
+        if self.in_use < self.limit and not self.depth():
+            self.in_use += 1
+            self.stats["admitted"] += 1
+            M_ADMISSION_WAIT.observe(0.0, self.name, priority)
+            return t0
+        rejected = self.check(priority)
+        if rejected is not None:
+            raise self._shed(rejected)
+        fut = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, [PRIORITY_CLASSES[priority], self._seq, fut, priority])
+        self.stats["queued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], self.depth())
+        try:
+            await asyncio.wait({fut}, timeout=ADMISSION_WAIT_MS[priority] / 1000.0)
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(time.perf_counter())  # slot was handed over just as we got cancelled
+            else:
+                fut.cancel()
+            raise
+        if not fut.done():
+            fut.cancel()
+            raise self._shed(AdmissionRejected(self.name, priority, "timeout", 503, self._retry_after(0.0)))
+        t1 = time.perf_counter()
+        self.stats["admitted"] += 1
+        M_ADMISSION_WAIT.observe(t1 - t0, self.name, priority)
+        timing_set(**{f"{self.name}_queue_ms": round((t1 - t0) * 1000.0, 1)})
+        return t1
+
+    def try_acquire(self, priority: str) -> Tuple[bool, Optional[float]]:
+        # non-blocking: take a free slot without queueing or jumping ahead of waiters
+        # -> (admitted?, ticket for release())
+        if not self.enabled:
+            return True, None
+        if self.in_use >= self.limit or self.depth():
+            return False, None
+        self.in_use += 1
+        self.stats["admitted"] += 1
+        M_ADMISSION_WAIT.observe(0.0, self.name, priority)
+        return True, time.perf_counter()
+
+    def release(self, ticket: Optional[float]):
+        if ticket is None:
+            return
+        hold = time.perf_counter() - ticket
+        self.ewma_hold_s = hold if self.ewma_hold_s is None else 0.8 * self.ewma_hold_s + 0.2 * hold
+        while self._waiters:
+            w = heapq.heappop(self._waiters)
+            if not w[2].done():
+                w[2].set_result(True)  # hand the slot over; in_use stays the same
+                return
+        self.in_use = max(self.in_use - 1, 0)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "queue_depth": self.depth(),
+            "queue_max": self.queue_max,
+            "ewma_hold_ms": None if self.ewma_hold_s is None else round(self.ewma_hold_s * 1000.0, 1),
+            **self.stats,
+        }
+
+
+ADMISSION_GATES = {
+    "stage1": AdmissionGate("stage1", ADMISSION_STAGE1_LIMIT or 4 * len(STAGE1_POOL.backends), ADMISSION_QUEUE_MAX),
+    "stage2": AdmissionGate("stage2", ADMISSION_STAGE2_LIMIT, ADMISSION_QUEUE_MAX),
+}
+
+
+def chain_admission_rejection(payload: AskRequest, modes, parsed: Optional[ParsedPrompt], rt: RequestTimings) -> Optional[JSONResponse]:
+    # chains touch stage2 always and stage1 only when the draft is neither canned nor memoized
+    if any(stage1_calls_upstream(payload, m, parsed) for m in modes):
+        rejected = admission_rejection("stage1", "interactive", rt)
+        if rejected is not None:
+            return rejected
+    return admission_rejection("stage2", "interactive", rt)
+
+
+def admission_rejection(upstream: str, priority: str, rt: Optional[RequestTimings] = None) -> Optional[JSONResponse]:
+    # endpoint pre-check, before the response starts: shed now instead of failing mid-stream
+    gate = ADMISSION_GATES[upstream]
+    e = gate.check(priority)
+    if e is None:
+        return None
+    gate._shed(e)
+    headers = {"Retry-After": str(int(math.ceil(e.retry_after_s)))}
+    if rt is not None:
+        headers.update(rt.headers())
+    return JSONResponse(
+        {"error": "overloaded", "upstream": upstream, "reason": e.reason, "retry_after_s": round(e.retry_after_s, 1)},
+        status_code=e.status,
+        headers=headers,
+    )
+
+
+# =========================
+# 🗂️ Session transcripts (delta ingestion)
+# =========================
+_SESSION_ID_RE = re.compile(SESSION_ID_PATTERN)
+
+
+def _split_transcript_lines(items) -> list:
+    # one seq per non-empty stripped line; items may hold several lines each
+    out = []
+    for chunk in items:
+        for ln in _to_str(chunk).splitlines():
+            s = ln.strip()
+            if s:
+                out.append(s)
+    return out
+
+
+class TranscriptBuffer:
+    # Append-only caption log for one meeting. The last-valid-line state is updated per appended
+    # line, so asking for the parsed prompt is O(delta) instead of re-scanning the whole transcript.
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.lines = deque()  # (seq, line)
+        self.chars = 0
+        self.seq = 0  # lines ever accepted (next line gets this seq)
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._last_valid = None  # (seq, parsed line)
+        self._last_interviewer = None  # (seq, parsed line)
+        self._teams_lines = 0  # "Teams •" dumps need the whole-text parser
+        self._text = None
+        self._parsed = None
+
+    def append(self, new_lines) -> int:
+        added = 0
+        for s in _split_transcript_lines(new_lines):
+            seq = self.seq
+            self.seq += 1
+            self.lines.append((seq, s))
+            self.chars += len(s) + 1
+            added += 1
+            if "Teams •" in s:
+                self._teams_lines += 1
+            if _is_ignored_line(s):
+                continue
+            p = _valid_message(s)
+            if not p:
+                continue
+            self._last_valid = (seq, p)
+            if _INTERVIEWER_PREFIX_RE.match(s):
+                self._last_interviewer = (seq, p)
+        while self.chars > SESSION_TRANSCRIPT_MAX_CHARS and len(self.lines) > 1:
+            _seq, old = self.lines.popleft()
+            self.chars -= len(old) + 1
+            if "Teams •" in old:
+                self._teams_lines -= 1
+        head = self.lines[0][0] if self.lines else self.seq
+        # a trimmed "latest" line means nothing newer qualified either
+        if self._last_valid and self._last_valid[0] < head:
+            self._last_valid = None
+        if self._last_interviewer and self._last_interviewer[0] < head:
+            self._last_interviewer = None
+        if added:
+            self.updated_at = time.time()
+            self._text = None
+            self._parsed = None
+        return added
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "\n".join(ln for _seq, ln in self.lines)
+        return self._text
+
+    def parsed(self) -> ParsedPrompt:
+        if self._parsed is None:
+            if self._teams_lines > 0:
+                self._parsed = parse_prompt(self.text())
+            else:
+                best = self._last_interviewer or self._last_valid
+                self._parsed = _parsed_from_last(self.text(), best[1] if best else None)
+        return self._parsed
+
+    def snapshot(self) -> dict:
+        return {
+            "seq": self.seq,
+            "lines": len(self.lines),
+            "chars": self.chars,
+            "idle_s": round(time.time() - self.updated_at, 1),
+        }
+
+
+def get_transcript(session_id: str, create: bool = False) -> Optional[TranscriptBuffer]:
+    st = get_session(session_id, create=create)
+    if st is None:
+        return None
+    if st.transcript is None and create:
+        st.transcript = TranscriptBuffer(st.session_id)
+    return st.transcript
 
 
-def refresh_context_background():
+def resolve_session_prompt(payload: AskRequest) -> Optional[ParsedPrompt]:
+    # session-backed request: fill payload.prompt from the buffer and hand back its parse
+    if (payload.prompt or "").strip() or not payload.session_id:
+        return None
+    buf = get_transcript(payload.session_id)
+    if buf is None or not buf.lines:
+        raise HTTPException(status_code=404, detail=f"Unknown or empty session '{payload.session_id}'")
+    payload.prompt = buf.text()
+    return buf.parsed()
+
+
+# =========================
+# 🛑 Upstream cancellation (client disconnect)
+# =========================
+CANCEL_LOCK = threading.Lock()
+CANCEL_STATS = {
+    "stage1": {"streams": 0, "tokens_received": 0, "tokens_avoided_est": 0},
+    "stage2": {"streams": 0, "tokens_received": 0},
+    "skipped_stage2": 0,
+    "disconnects": 0,
+}
+
+
+def record_upstream_cancel(stage: str, tokens_received: int, tokens_avoided_est: int = 0):
+    with CANCEL_LOCK:
+        st = CANCEL_STATS[stage]
+        st["streams"] += 1
+        st["tokens_received"] += max(int(tokens_received), 0)
+        if "tokens_avoided_est" in st:
+            st["tokens_avoided_est"] += max(int(tokens_avoided_est), 0)
+
+
+def _cancel_stats_snapshot() -> dict:
+    with CANCEL_LOCK:
+        return json.loads(json.dumps(CANCEL_STATS))
+
+
+def _bump_cancel(key: str):
+    with CANCEL_LOCK:
+        CANCEL_STATS[key] += 1
+
+
+async def _wait_for_disconnect(request: Request):
+    poll_s = max(DISCONNECT_POLL_MS, 10) / 1000.0
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_s)
+
+
+async def guard_disconnect(request: Request, gen: AsyncIterator[bytes], tag: str) -> AsyncIterator[bytes]:
+    # Stops pulling from `gen` the moment the client goes away; cancelling the pending
+    # __anext__ unwinds the upstream `async with ...stream()` so llama.cpp/Ollama stop generating.
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    nxt = None
+    sent = 0
+    INTERACTIVE_ACTIVE["streams"] += 1
     try:
-        ctx = refresh_context_sync()
-        if ctx:
-            with STATE_LOCK:
-                at = LAST_CONTEXT_AT
-            log.info("[context] updated_at=%.0f ctx_preview=%r", at, ctx[:160])
-    except Exception as e:
-        log.info("[context] failed: %s", e)
+        it = gen.__aiter__()
+        while True:
+            nxt = asyncio.ensure_future(it.__anext__())
+            done, _ = await asyncio.wait({nxt, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if nxt not in done:
+                _bump_cancel("disconnects")
+                log.info("[disconnect] %s client went away; closing upstream", tag)
+                break
+            try:
+                b = nxt.result()
+            except StopAsyncIteration:
+                break
+            sent += len(b)
+            yield b
+    except (asyncio.CancelledError, GeneratorExit):
+        # server-side cancel (e.g. Starlette saw http.disconnect first)
+        _bump_cancel("disconnects")
+        log.info("[disconnect] %s stream cancelled; closing upstream", tag)
+        raise
+    finally:
+        INTERACTIVE_ACTIVE["streams"] -= 1
+        M_STREAM_BYTES.observe(sent, request.url.path)  # route path, like the other per-request metrics
+        watcher.cancel()
+        if nxt is not None and not nxt.done():
+            nxt.cancel()
+            try:
+                await nxt
+            except BaseException:
+                pass
+        await gen.aclose()
+
+
+async def _bytes_stream(gen: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in gen:
+            yield _to_str(chunk).encode("utf-8", errors="ignore")
+    finally:
+        await gen.aclose()
+
+
+# =========================
+# ⏭️ Latest-wins preemption (per session / preempt key)
+# =========================
+class PreemptClaim:
+    def __init__(self, key: str, rt: RequestTimings):
+        self.key = key
+        self.rt = rt
+        self.event = asyncio.Event()
+        self.by = ""
+
+
+class PreemptionRegistry:
+    # One live stream per (endpoint, key). claim() by a newer request signals the older claim;
+    # preemptible() then closes its generator, which unwinds the upstream stage-1/stage-2 calls
+    # (or leaves the coalesced flight, cancelled once nobody else listens).
+    def __init__(self):
+        self._current = {}
+        self.stats = {"claims": 0, "preempted": 0}
+
+    def claim(self, endpoint: str, key: str, rt: RequestTimings) -> PreemptClaim:
+        c = PreemptClaim(f"{endpoint}|{key}", rt)
+        old = self._current.get(c.key)
+        if old is not None and not old.event.is_set():
+            old.by = rt.request_id
+            old.rt.set(preempted_by=rt.request_id)
+            old.event.set()
+            self.stats["preempted"] += 1
+            M_PREEMPTIONS.inc(endpoint)
+            log.info("[preempt] %s key=%s request=%s superseded by %s", endpoint, key, old.rt.request_id, rt.request_id)
+        self._current[c.key] = c
+        self.stats["claims"] += 1
+        return c
+
+    def release(self, c: PreemptClaim):
+        if self._current.get(c.key) is c:
+            del self._current[c.key]
+
+    def snapshot(self) -> dict:
+        return {"default": PREEMPT_DEFAULT, "active_keys": len(self._current), **self.stats}
+
+
+PREEMPTION = PreemptionRegistry()
+
+
+def preempt_claim(req: Request, payload: AskRequest, rt: RequestTimings) -> Optional[PreemptClaim]:
+    # only an explicit key or session scopes a client: session-less callers share the default
+    # session, and a second tab must not cancel the first one's stream
+    if not payload.preempt:
+        return None
+    key = (payload.preempt_key or "").strip() or (payload.session_id or "").strip()
+    if not key:
+        return None
+    return PREEMPTION.claim(req.url.path, key, rt)
+
+
+async def preemptible(gen: AsyncIterator[bytes], claim: PreemptClaim, marker=None) -> AsyncIterator[bytes]:
+    # same pull loop as guard_disconnect, with "a newer request took the key" as the stop signal;
+    # marker(by) -> bytes replaces the [preempted] line (event streams built without the parser)
+    waiter = asyncio.ensure_future(claim.event.wait())
+    nxt = None
+    preempted = False
+    try:
+        it = gen.__aiter__()
+        while True:
+            nxt = asyncio.ensure_future(it.__anext__())
+            done, _ = await asyncio.wait({nxt, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if nxt not in done:
+                preempted = True
+                break
+            try:
+                b = nxt.result()
+            except StopAsyncIteration:
+                break
+            yield b
+        if preempted:
+            nxt.cancel()
+            try:
+                await nxt
+            except BaseException:
+                pass
+            await gen.aclose()
+            yield marker(claim.by) if marker is not None else f"\n[preempted] {claim.by}\n".encode("utf-8")
+    finally:
+        waiter.cancel()
+        if nxt is not None and not nxt.done():
+            nxt.cancel()
+            try:
+                await nxt
+            except BaseException:
+                pass
+        await gen.aclose()
+        PREEMPTION.release(claim)
 
 
 # =========================
 # 🌊 Stage 2 streaming (Ollama)
 # =========================
-def stream_ollama_chat(system_prompt: str, user_text: str, options: dict, sanitize_newlines: bool = True):
+STAGE2_HEDGE_STATS = {"requests": 0, "hedged": 0, "fired_on_error": 0, "primary_wins": 0, "hedge_wins": 0, "failed": 0, "losers_cancelled": 0, "skipped_no_slot": 0}
+
+
+def stage2_hedge_enabled() -> bool:
+    return STAGE2_HEDGE_AFTER_MS > 0
+
+
+async def _ollama_chat_events(url: str, model: str, system_prompt: str, user_text: str, options: dict) -> AsyncIterator[tuple]:
+    # one /api/chat stream -> ("connect", perf_counter) then ("token", text)... or ("error", message); ends at done
     payload = {
-        "model": MODEL,
+        "model": model,
         "stream": True,
         "messages": [
             {"role": "system", "content": system_prompt},
@@ -891,14 +2902,12 @@ def stream_ollama_chat(system_prompt: str, user_text: str, options: dict, saniti
         ],
         "options": options,
     }
-    with requests.post(
-        OLLAMA_URL,
-        json=payload,
-        stream=True,
-        timeout=(CONNECT_TIMEOUT, TIMEOUT),
-    ) as r:
+    if OLLAMA_KEEP_ALIVE:
+        payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+    async with get_upstream_client("stage2").stream("POST", url, json=payload) as r:
         r.raise_for_status()
-        for raw_line in r.iter_lines(decode_unicode=True):
+        yield ("connect", time.perf_counter())
+        async for raw_line in r.aiter_lines():
             if not raw_line:
                 continue
             raw_line = _maybe_strip_sse_prefix(raw_line)
@@ -909,17 +2918,208 @@ def stream_ollama_chat(system_prompt: str, user_text: str, options: dict, saniti
             except Exception:
                 continue
             if msg.get("error"):
-                yield f"[ollama_error] {msg['error']}\n"
+                yield ("error", str(msg["error"]))
                 return
             chunk = (msg.get("message") or {}).get("content") or ""
             if chunk:
-                if sanitize_newlines:
-                    chunk = chunk.replace("\r", " ").replace("\n", " ")
-                yield chunk
+                yield ("token", chunk)
             if msg.get("done"):
                 return
 
 
+async def _first_events(gen: AsyncIterator[tuple]) -> list:
+    # advance an attempt up to (and including) its first token/error
+    seen = []
+    async for ev in gen:
+        seen.append(ev)
+        if ev[0] != "connect":
+            break
+    return seen
+
+
+async def _race_hedged(primary, make_hedge, on_close=None):
+    # Waits STAGE2_HEDGE_AFTER_MS for the primary's first token, then fires the hedge (also right
+    # away if the primary fails first and STAGE2_HEDGE_ON_ERROR). The first attempt to produce a
+    # token (or finish cleanly) wins and the other is cancelled.
+    # make_hedge() -> gen, or None when there is no admission slot for it (hedge skipped);
+    # on_close(gen) runs after each losing attempt is closed (releases its admission ticket).
+    # -> (winner gen, its first events, "primary" | "hedge", hedged?)
+    st = STAGE2_HEDGE_STATS
+    st["requests"] += 1
+    names = {primary: "primary"}
+    tasks = {asyncio.ensure_future(_first_events(primary)): primary}
+    hedge = None
+    armed = True
+    failures = []  # (gen, events, exception)
+    deadline = time.perf_counter() + STAGE2_HEDGE_AFTER_MS / 1000.0
+    winner = None
+
+    def _fire(reason: str):
+        nonlocal hedge, armed
+        armed = False
+        hedge = make_hedge()
+        if hedge is None:
+            st["skipped_no_slot"] += 1
+            M_STAGE2_HEDGES.inc("skipped")
+            log.info("[stage2] hedge skipped (%s): no stage2 admission slot", reason)
+            return
+        names[hedge] = "hedge"
+        tasks[asyncio.ensure_future(_first_events(hedge))] = hedge
+        st["hedged"] += 1
+        if reason == "error":
+            st["fired_on_error"] += 1
+        timing_set(stage2_hedged=reason, stage2_hedge_at_ms=timing_offset_ms())
+        log.info("[stage2] hedge fired (%s) -> model=%s url=%s", reason, STAGE2_HEDGE_MODEL or MODEL, STAGE2_HEDGE_URL or OLLAMA_URL)
+
+    try:
+        while tasks:
+            timeout = max(deadline - time.perf_counter(), 0.0) if armed else None
+            done, _ = await asyncio.wait(set(tasks), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                _fire("slow")
+                continue
+            for t in sorted(done, key=lambda x: names[tasks[x]] != "primary"):
+                g = tasks.pop(t)
+                exc = t.exception()
+                evs = None if exc is not None else t.result()
+                if exc is None and not (evs and evs[-1][0] == "error"):
+                    winner = (g, evs)
+                    break
+                failures.append((g, evs, exc))
+                if g is primary and armed and STAGE2_HEDGE_ON_ERROR:
+                    _fire("error")
+            if winner is not None:
+                break
+
+        if winner is None:
+            st["failed"] += 1
+            if hedge is not None:
+                M_STAGE2_HEDGES.inc("failed")
+            # report the primary's failure, count the rest
+            failures.sort(key=lambda f: names[f[0]] != "primary")
+            g, evs, exc = failures[0]
+            for _g, _evs, _exc in failures[1:]:
+                M_UPSTREAM_ERRORS.inc("stage2", "http" if _exc is not None else "model")
+            if exc is not None:
+                raise exc
+            return g, evs, names[g], hedge is not None
+
+        g, evs = winner
+        for _g, _evs, _exc in failures:
+            M_UPSTREAM_ERRORS.inc("stage2", "http" if _exc is not None else "model")
+        if hedge is not None:
+            st["primary_wins" if g is primary else "hedge_wins"] += 1
+            M_STAGE2_HEDGES.inc("primary_won" if g is primary else "hedge_won")
+            timing_set(stage2_winner=names[g])
+        return g, evs, names[g], hedge is not None
+    finally:
+        for t, g in tasks.items():
+            if winner is not None and g is winner[0]:
+                continue
+            if not t.done():
+                t.cancel()
+                st["losers_cancelled"] += 1
+            try:
+                await t
+            except BaseException:
+                pass
+        for g in names:
+            if winner is None or g is not winner[0]:
+                await g.aclose()
+                if on_close is not None:
+                    on_close(g)
+
+
+async def stream_ollama_chat(
+    system_prompt: str,
+    user_text: str,
+    options: dict,
+    sanitize_newlines: bool = True,
+    call: str = "chain",
+) -> AsyncIterator[str]:
+    # call: metrics label (chain | corrector); also picks the admission priority
+    n_tokens = 0
+    finished = False
+    t0 = time.perf_counter()
+    first_at = 0.0
+    timing_set(stage2_start_at_ms=timing_offset_ms())
+    gate = ADMISSION_GATES["stage2"]
+    priority = "rewrite" if call == "corrector" else "interactive"
+    try:
+        ticket = await gate.acquire(priority)
+    except AdmissionRejected as e:
+        yield f"[ollama_error] {e}\n"
+        return
+    gen = _ollama_chat_events(OLLAMA_URL, MODEL, system_prompt, user_text, options)
+    tickets = {gen: ticket}  # one admission slot per live attempt (primary, hedge)
+    first = []
+    served_by = "primary"
+    try:
+        if stage2_hedge_enabled():
+            hedge_url, hedge_model = STAGE2_HEDGE_URL or OLLAMA_URL, STAGE2_HEDGE_MODEL or MODEL
+
+            def _make_hedge():
+                ok, t = gate.try_acquire(priority)
+                if not ok:
+                    return None
+                g = _ollama_chat_events(hedge_url, hedge_model, system_prompt, user_text, options)
+                tickets[g] = t
+                return g
+
+            gen, first, served_by, _hedged = await _race_hedged(gen, _make_hedge, on_close=lambda g: gate.release(tickets.pop(g, None)))
+
+        pending = list(first)  # events the hedge race already pulled from the winner
+        while True:
+            if pending:
+                kind, chunk = pending.pop(0)
+            else:
+                try:
+                    kind, chunk = await gen.__anext__()
+                except StopAsyncIteration:
+                    break
+            if kind == "connect":
+                timing_set(stage2_connect_ms=round((chunk - t0) * 1000.0, 1))
+                continue
+            if kind == "error":
+                finished = True
+                M_UPSTREAM_ERRORS.inc("stage2", "model")
+                yield f"[ollama_error] {chunk}\n"
+                return
+            if not n_tokens:
+                if served_by == "primary":
+                    WARMUP.touch("stage2")
+                first_at = time.perf_counter()
+                M_STAGE2_TTFT.observe(first_at - t0, call)
+                timing_set(stage2_ttft_ms=round((first_at - t0) * 1000.0, 1))
+            n_tokens += 1
+            if sanitize_newlines:
+                chunk = chunk.replace("\r", " ").replace("\n", " ")
+            yield chunk
+        finished = True
+    except (asyncio.CancelledError, GeneratorExit):
+        if not finished:
+            record_upstream_cancel("stage2", n_tokens)
+        raise
+    except httpx.HTTPError as e:
+        # connect refused / timeout / HTTP status: a typed marker instead of a torn-down stream
+        M_UPSTREAM_ERRORS.inc("stage2", "http")
+        log.info("[stage2] http_error=%s", _to_str(e) or type(e).__name__)
+        yield ("\n" if n_tokens else "") + f"[ollama_error] {_to_str(e) or type(e).__name__}\n"
+    except Exception:
+        M_UPSTREAM_ERRORS.inc("stage2", "http")
+        raise
+    finally:
+        await gen.aclose()
+        for t in tickets.values():
+            gate.release(t)
+        if finished:
+            end_at = time.perf_counter()
+            M_STAGE2_TOTAL.observe(end_at - t0, call)
+            timing_set(stage2_total_ms=round((end_at - t0) * 1000.0, 1), stage2_tokens=n_tokens)
+            observe_generation("stage2", n_tokens, first_at, end_at)
+
+
+
 # =========================
 # 🧠 Stage 1: llama.cpp /completion (stream + capture, delta-safe)
 # =========================
@@ -998,31 +3198,140 @@ def _is_done_obj(obj: dict) -> bool:
     return False
 
 
-def stream_and_collect_llama_api(req: AskRequest, mode: str) -> Tuple[Iterator[bytes], bytearray]:
-    url = (req.url or LLAMA_DEFAULT_URL).strip() or LLAMA_DEFAULT_URL
+def stage1_draft_key(stage1_user: str, url: str, n_predict: int, temperature: float, top_p: float) -> str:
+    # the TIME line changes every minute but doesn't change the draft -> keep it out of the key
+    stable = "\n".join(ln for ln in stage1_user.split("\n") if not ln.startswith("TIME:"))
+    return _digest(stable, url, n_predict, f"{temperature:.4f}", f"{top_p:.4f}", prompt_files_version())
+
+
+def stage1_memo_key(req: AskRequest, stage1_user: str) -> str:
+    url = (req.url or "").strip() or LLAMA_DEFAULT_URL
+    temperature = float(req.temperature if req.temperature is not None else LLAMA_DEFAULT_TEMPERATURE)
+    top_p = float(req.top_p if req.top_p is not None else LLAMA_DEFAULT_TOPP)
+    return stage1_draft_key(stage1_user, url, _effective_stage1_n_predict(req), temperature, top_p)
+
+
+def stage1_calls_upstream(req: AskRequest, mode: str, parsed: Optional[ParsedPrompt] = None) -> bool:
+    # mirrors the early returns of stream_and_collect_llama_api: canned reply / draft memo hit
+    pp = parsed or parse_prompt(req.prompt)
+    author, _speech, stage1_user = build_stage1_user_text(req.prompt, mode=mode, parsed=pp)
+    if _canned_reply(author, pp.lang, pp.canned, mode):
+        return False
+    if DRAFT_CACHE_ENABLED and not req.no_cache:
+        return not DRAFT_CACHE.peek(stage1_memo_key(req, stage1_user))
+    return True
+
+
+def stage1_session_key(session_id: Optional[str], mode: str) -> str:
+    return f"{(session_id or '').strip() or DEFAULT_SESSION_ID}|{mode}"
+
+
+def stage1_slot_for(session_id: Optional[str], mode: str) -> Optional[int]:
+    # sticky llama.cpp slot per (session, mode): that slot's KV cache keeps the session's prefix warm
+    if LLAMA_SLOTS <= 0:
+        return None
+    key = stage1_session_key(session_id, mode)
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % LLAMA_SLOTS
+
+
+STAGE1_PREFILL_STATS = {
+    "requests": 0,
+    "prompt_tokens_evaluated": 0,
+    "prompt_tokens_cached": 0,
+    "prompt_ms_total": 0.0,
+    "saved_ms_est_total": 0.0,
+}
+
+
+def record_stage1_timings(obj: dict) -> dict:
+    # llama.cpp final chunk: timings.{prompt_n, prompt_ms, cache_n?} (+ tokens_cached on older builds)
+    t = obj.get("timings") or {}
+    try:
+        prompt_n = int(t.get("prompt_n") or 0)
+        prompt_ms = float(t.get("prompt_ms") or 0.0)
+        cached = int(t.get("cache_n") if t.get("cache_n") is not None else (obj.get("tokens_cached") or 0))
+    except Exception:
+        return {}
+    per_tok_ms = prompt_ms / prompt_n if prompt_n > 0 else 0.0
+    saved_ms = cached * per_tok_ms
+    st = STAGE1_PREFILL_STATS
+    st["requests"] += 1
+    st["prompt_tokens_evaluated"] += prompt_n
+    st["prompt_tokens_cached"] += cached
+    st["prompt_ms_total"] += prompt_ms
+    st["saved_ms_est_total"] += saved_ms
+    return {
+        "prompt_tokens_evaluated": prompt_n,
+        "prompt_tokens_cached": cached,
+        "prompt_ms": round(prompt_ms, 1),
+        "prefill_saved_ms_est": round(saved_ms, 1),
+        "predicted_n": t.get("predicted_n"),
+        "predicted_ms": t.get("predicted_ms"),
+    }
+
+
+def stage1_timings_line(meta: Optional[dict]) -> bytes:
+    # opt-in in-band marker (report_timings); empty when stage1 was canned/memoized
+    if not meta:
+        return b""
+    return ("\n[stage1_timings] " + json.dumps(meta, ensure_ascii=False) + "\n").encode("utf-8")
 
-    author, speech, stage1_user = build_stage1_user_text(req.prompt, mode=mode)
-    canned = _stage1_canned(author, speech, mode=mode)
+
+def stream_and_collect_llama_api(
+    req: AskRequest,
+    mode: str,
+    parsed: Optional[ParsedPrompt] = None,
+    meta: Optional[dict] = None,
+) -> Tuple[AsyncIterator[bytes], bytearray]:
+    # meta (optional): filled with llama.cpp prefill timings once the stream finishes
+    t_build = time.perf_counter()
+    explicit_url = (req.url or "").strip()  # a per-request url bypasses the backend pool
+    url = explicit_url or LLAMA_DEFAULT_URL
+
+    pp = parsed or parse_prompt(req.prompt)
+    author, _speech, stage1_user = build_stage1_user_text(req.prompt, mode=mode, parsed=pp)
+    canned = _canned_reply(author, pp.lang, pp.canned, mode)
     if canned:
+        M_CANNED.inc(pp.canned)
+        timing_set(stage1="canned")
         b = canned.encode("utf-8", errors="ignore")
         buf = bytearray(b)
 
-        def _gen_canned() -> Iterator[bytes]:
+        async def _gen_canned() -> AsyncIterator[bytes]:
             yield b
 
         return _gen_canned(), buf
 
-    # ✅ Stage1 system gets profile + timestamp context
-    final_prompt = build_llama3_chat_prompt(_with_profile_and_time(STAGE1_SYSTEM()), stage1_user)
+    n_predict = _effective_stage1_n_predict(req)
+    temperature = float(req.temperature if req.temperature is not None else LLAMA_DEFAULT_TEMPERATURE)
+    top_p = float(req.top_p if req.top_p is not None else LLAMA_DEFAULT_TOPP)
+
+    draft_key = ""
+    if DRAFT_CACHE_ENABLED:
+        draft_key = stage1_memo_key(req, stage1_user)
+        memo = None if req.no_cache else DRAFT_CACHE.get(draft_key)
+        if memo is not None:
+            log.info("[stage1] draft memo hit mode=%s bytes=%d", mode, len(memo))
+            timing_set(stage1="memo")
+            buf = bytearray(memo)
+
+            async def _gen_memo() -> AsyncIterator[bytes]:
+                yield memo
+
+            return _gen_memo(), buf
+
+    # ✅ Stage1 system gets profile (+ timestamp, unless the stable-prefix layout keeps time in the user tail)
+    stage1_system = _with_profile(STAGE1_SYSTEM()) if STAGE1_STABLE_PREFIX else _with_profile_and_time(STAGE1_SYSTEM())
+    final_prompt = build_llama3_chat_prompt(stage1_system, stage1_user)
 
     body = {
         "prompt": final_prompt,
         "stream": True,
         "echo": False,
-        "n_predict": _effective_stage1_n_predict(req),
-        "temperature": float(req.temperature if req.temperature is not None else LLAMA_DEFAULT_TEMPERATURE),
+        "n_predict": n_predict,
+        "temperature": temperature,
         "top_k": int(LLAMA_DEFAULT_TOPK),
-        "top_p": float(req.top_p if req.top_p is not None else LLAMA_DEFAULT_TOPP),
+        "top_p": top_p,
         "typical_p": float(LLAMA_DEFAULT_TYPICALP),
         "min_p": float(LLAMA_DEFAULT_MINP),
         "repeat_last_n": int(LLAMA_DEFAULT_REPEAT_LAST_N),
@@ -1030,86 +3339,187 @@ def stream_and_collect_llama_api(req: AskRequest, mode: str) -> Tuple[Iterator[b
         "presence_penalty": float(LLAMA_DEFAULT_PRESENCE_PENALTY),
         "frequency_penalty": float(LLAMA_DEFAULT_FREQUENCY_PENALTY),
         "stop": STAGE1_STOP,
+        "cache_prompt": STAGE1_CACHE_PROMPT,
     }
-
-    log.info(
-        "[stage1] url=%s mode=%s n_predict=%s temp=%.3f top_p=%.3f",
-        url,
-        mode,
-        body["n_predict"],
-        body["temperature"],
-        body["top_p"],
-    )
+    slot = stage1_slot_for(req.session_id, mode)
+    if slot is not None:
+        body["id_slot"] = slot
+    timing_set(stage1="llama", stage1_build_ms=round((time.perf_counter() - t_build) * 1000.0, 2))
+    sticky_key = stage1_session_key(req.session_id, mode)
 
     buf = bytearray()
 
-    def _gen() -> Iterator[bytes]:
-        acc = ""
+    async def _gen() -> AsyncIterator[bytes]:
+        gate = ADMISSION_GATES["stage1"]
+        try:
+            ticket = await gate.acquire("interactive")
+        except AdmissionRejected as e:
+            b = f"[stage1_http_error] {e}\n".encode("utf-8", errors="ignore")
+            buf.extend(b)
+            yield b
+            return
+        inner = _stream()
+        try:
+            async for ch in inner:
+                yield ch
+        finally:
+            await inner.aclose()
+            gate.release(ticket)
+
+    async def _stream() -> AsyncIterator[bytes]:
+        acc = ""  # raw stream, only for detecting upstreams that resend the cumulative text
+        matcher = StreamStopMatcher(STAGE1_STOP)
+        truncated = False
         printed = 0
+        n_deltas = 0
+        finished = False
         headers = {"Accept": "text/event-stream,application/json"}
-        try:
-            with requests.post(
-                url,
-                json=body,
-                stream=True,
-                headers=headers,
-                timeout=(STAGE1_CONNECT_TIMEOUT, STAGE1_TIMEOUT),
-            ) as r:
-                r.raise_for_status()
-                for raw_line in r.iter_lines(decode_unicode=True):
-                    if not raw_line:
-                        continue
-                    line = _maybe_strip_sse_prefix(raw_line)
-                    if not line:
-                        continue
-                    if line.strip() == "[DONE]":
-                        break
+        t0 = time.perf_counter()
+        first_at = 0.0
+        tried = []
+        timing_set(stage1_start_at_ms=timing_offset_ms())
+        while True:
+            backend = None if explicit_url else STAGE1_POOL.pick(sticky_key, exclude=tried)
+            target = backend.url if backend is not None else url
+            if backend is not None:
+                STAGE1_POOL.begin(backend)
+                if STAGE1_POOL.pooled:
+                    timing_set(stage1_backend=target)
+            log.info(
+                "[stage1] url=%s mode=%s n_predict=%s temp=%.3f top_p=%.3f",
+                target,
+                mode,
+                body["n_predict"],
+                body["temperature"],
+                body["top_p"],
+            )
+            ok = True
+            err = ""
+            failover = False
+            t_attempt = time.perf_counter()
+            try:
+                async with get_upstream_client("stage1").stream("POST", target, json=body, headers=headers) as r:
+                    timing_set(stage1_connect_ms=round((time.perf_counter() - t_attempt) * 1000.0, 1))
+                    r.raise_for_status()
+                    async for raw_line in r.aiter_lines():
+                        if not raw_line:
+                            continue
+                        line = _maybe_strip_sse_prefix(raw_line)
+                        if not line:
+                            continue
+                        if line.strip() == "[DONE]":
+                            break
 
-                    obj = None
-                    try:
-                        obj = json.loads(line)
-                    except Exception:
                         obj = None
-
-                    txt = ""
-                    done = False
-                    if isinstance(obj, dict):
-                        txt = _get_delta_from_obj(obj)
-                        done = _is_done_obj(obj)
-                    else:
-                        txt = str(line)
-
-                    if not txt and not done:
-                        continue
-
-                    if txt:
-                        if len(txt) >= len(acc) and txt.startswith(acc):
-                            acc = txt
+                        try:
+                            obj = json.loads(line)
+                        except Exception:
+                            obj = None
+
+                        txt = ""
+                        done = False
+                        if isinstance(obj, dict):
+                            txt = _get_delta_from_obj(obj)
+                            done = _is_done_obj(obj)
+                            if isinstance(obj.get("timings"), dict):
+                                t1 = record_stage1_timings(obj)
+                                if t1:
+                                    log.info(
+                                        "[stage1] prefill evaluated=%s cached=%s prompt_ms=%s saved_ms_est=%s slot=%s",
+                                        t1["prompt_tokens_evaluated"],
+                                        t1["prompt_tokens_cached"],
+                                        t1["prompt_ms"],
+                                        t1["prefill_saved_ms_est"],
+                                        slot,
+                                    )
+                                if meta is not None:
+                                    meta.update(t1)
                         else:
-                            acc += txt
-
-                    one = strip_prompt_echo(acc.replace("\r", "").replace("\n", " ").strip())
-                    cut = find_stop_index(one, STAGE1_STOP)
-                    if cut >= 0:
-                        one = one[:cut].strip()
-
-                    if len(one) > printed:
-                        out = one[printed:]
-                        b = out.encode("utf-8", errors="ignore")
-                        buf.extend(b)
-                        yield b
-                        printed = len(one)
-
-                    if STAGE1_STREAM_MAX_BYTES > 0 and len(buf) >= STAGE1_STREAM_MAX_BYTES:
-                        break
-                    if cut >= 0 or done:
-                        break
-
-        except Exception as e:
-            msg = f"[stage1_http_error] {e}\n"
-            b = msg.encode("utf-8", errors="ignore")
-            buf.extend(b)
-            yield b
+                            txt = str(line)
+
+                        if not txt and not done:
+                            continue
+
+                        out = ""
+                        if txt:
+                            if not n_deltas and target == LLAMA_DEFAULT_URL:
+                                WARMUP.touch("stage1")
+                            n_deltas += 1
+                            if len(txt) >= len(acc) and txt.startswith(acc):
+                                delta = txt[len(acc):]
+                                acc = txt
+                            else:
+                                delta = txt
+                                acc += txt
+                            out = matcher.feed(delta)
+                        if done and not matcher.stopped:
+                            out += matcher.flush()
+                        finished = matcher.stopped or done
+
+                        if out:
+                            b = out.encode("utf-8", errors="ignore")
+                            buf.extend(b)
+                            if not printed:
+                                first_at = time.perf_counter()
+                                M_STAGE1_TTFT.observe(first_at - t0, mode)
+                                timing_set(stage1_ttft_ms=round((first_at - t0) * 1000.0, 1))
+                            yield b
+                            printed += len(out)
+
+                        if STAGE1_STREAM_MAX_BYTES > 0 and len(buf) >= STAGE1_STREAM_MAX_BYTES:
+                            M_TRUNCATIONS.inc("stage1_stream_max_bytes")
+                            truncated = True
+                            break
+                        if matcher.stopped or done:
+                            break
+                    if not truncated:
+                        # [DONE] / upstream closed without a done flag: release the held-back tail
+                        tail = matcher.flush()
+                        if tail:
+                            b = tail.encode("utf-8", errors="ignore")
+                            buf.extend(b)
+                            yield b
+                finished = True
+
+            except (asyncio.CancelledError, GeneratorExit):
+                if not finished:
+                    ok = None  # client gone / preempted: says nothing about the backend
+                    record_upstream_cancel("stage1", n_deltas, body["n_predict"] - n_deltas)
+                raise
+            except Exception as e:
+                finished = False
+                ok = False
+                err = _to_str(e) or type(e).__name__
+                M_UPSTREAM_ERRORS.inc("stage1", "http")
+                # nothing reached the client yet: another backend can still answer
+                failover = (
+                    backend is not None
+                    and LLAMA_POOL_FAILOVER
+                    and not n_deltas
+                    and len(tried) + 1 < len(STAGE1_POOL.backends)
+                )
+                if not failover:
+                    msg = f"[stage1_http_error] {e}\n"
+                    b = msg.encode("utf-8", errors="ignore")
+                    buf.extend(b)
+                    yield b
+            finally:
+                if backend is not None:
+                    STAGE1_POOL.end(backend, ok, (first_at - t_attempt) if first_at else None, err)
+            if not failover:
+                break
+            tried.append(backend)
+            STAGE1_POOL.stats["failovers"] += 1
+            timing_set(stage1_failovers=len(tried))
+            log.warning("[pool] stage1 failover from %s: %s", target, err[:200])
+
+        if finished:
+            end_at = time.perf_counter()
+            M_STAGE1_TOTAL.observe(end_at - t0, mode)
+            timing_set(stage1_total_ms=round((end_at - t0) * 1000.0, 1), stage1_deltas=n_deltas)
+            observe_generation("stage1", n_deltas, first_at or end_at, end_at)
+        if finished and draft_key and buf:
+            DRAFT_CACHE.put(draft_key, bytes(buf))
 
     return _gen(), buf
 
@@ -1130,14 +3540,18 @@ async def _read_payload(request: Request) -> AskRequest:
 
     try:
         payload = AskRequest.model_validate(data)
-    except ValidationError:
-        raise HTTPException(status_code=400, detail="Invalid payload (expected: {prompt: string, ...})")
+    except ValidationError as e:
+        fields = sorted({str(err["loc"][0]) for err in e.errors() if err.get("loc")})
+        raise HTTPException(status_code=400, detail=f"Invalid payload field(s): {', '.join(fields) or '?'} (expected: {{prompt: string, ...}})")
 
     prompt = (payload.prompt or "").strip()
+    if not prompt and payload.session_id:
+        return payload
     if not prompt:
         raise HTTPException(status_code=400, detail="Missing/empty 'prompt'")
 
     if len(prompt) > MAX_PROMPT_CHARS:
+        M_TRUNCATIONS.inc("max_prompt_chars")
         payload.prompt = prompt[:MAX_PROMPT_CHARS]
 
     return payload
@@ -1163,6 +3577,13 @@ def serve_index():
 # =========================
 # ✅ HEALTH
 # =========================
+@app.get("/metrics")
+def metrics():
+    if not METRICS_ENABLED:
+        return JSONResponse({"error": "metrics disabled"}, status_code=404)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/health")
 def health():
     return {
@@ -1171,6 +3592,10 @@ def health():
             "dir": str(PROMPTS_DIR),
             "strict": PROMPTS_STRICT,
             "auto_reload": PROMPTS_AUTO_RELOAD,
+            "poll_s": PROMPTS_POLL_S,
+            "version": _PROMPTS.version,
+            "loaded_at": _PROMPTS.loaded_at,
+            **PROMPT_RELOADS,
             "files": {k: str(PROMPTS_DIR / v) for k, v in PROMPT_FILES.items()},
         },
         "time_context": {
@@ -1189,21 +3614,91 @@ def health():
             "stage1_stream_max_bytes": STAGE1_STREAM_MAX_BYTES,
             "stage1_draft_max_chars": STAGE1_DRAFT_MAX_CHARS,
             "timeouts": {"connect_s": STAGE1_CONNECT_TIMEOUT, "total_s": STAGE1_TIMEOUT},
+            "stable_prefix": STAGE1_STABLE_PREFIX,
+            "cache_prompt": STAGE1_CACHE_PROMPT,
+            "slots": LLAMA_SLOTS,
+            "pool": STAGE1_POOL.snapshot(),
+            "prefill": {k: (round(v, 1) if isinstance(v, float) else v) for k, v in STAGE1_PREFILL_STATS.items()},
+        },
+        "overlap": {
+            "default": STAGE2_OVERLAP_DEFAULT,
+            "min_tokens": STAGE2_OVERLAP_MIN_TOKENS,
+            "min_chars": STAGE2_OVERLAP_MIN_CHARS,
+            "deadline_ms": STAGE2_OVERLAP_DEADLINE_MS,
+        },
+        "stage2": {
+            "ollama_url": OLLAMA_URL,
+            "model": MODEL,
+            "hedge": {
+                "enabled": stage2_hedge_enabled(),
+                "after_ms": STAGE2_HEDGE_AFTER_MS,
+                "model": STAGE2_HEDGE_MODEL or MODEL,
+                "url": STAGE2_HEDGE_URL or OLLAMA_URL,
+                "on_error": STAGE2_HEDGE_ON_ERROR,
+                **STAGE2_HEDGE_STATS,
+                "hedge_rate": round(STAGE2_HEDGE_STATS["hedged"] / STAGE2_HEDGE_STATS["requests"], 3) if STAGE2_HEDGE_STATS["requests"] else None,
+                "hedge_win_rate": round(STAGE2_HEDGE_STATS["hedge_wins"] / STAGE2_HEDGE_STATS["hedged"], 3) if STAGE2_HEDGE_STATS["hedged"] else None,
+            },
+        },
+        "upstream_cancellations": _cancel_stats_snapshot(),
+        "response_cache": {"enabled": RESPONSE_CACHE_ENABLED, **RESPONSE_CACHE.snapshot()},
+        "draft_cache": {"enabled": DRAFT_CACHE_ENABLED, **DRAFT_CACHE.snapshot()},
+        "sessions": sessions_snapshot(),
+        "consolidator": CONSOLIDATOR.snapshot(),
+        "warmup": WARMUP.snapshot(),
+        "coalescing": {"enabled": COALESCE_ENABLED, "in_flight": len(_FLIGHTS), **COALESCE_STATS},
+        "preemption": PREEMPTION.snapshot(),
+        "admission": {
+            "enabled": ADMISSION_ENABLED,
+            "wait_ms": ADMISSION_WAIT_MS,
+            **{name: g.snapshot() for name, g in ADMISSION_GATES.items()},
+        },
+        "streaming": {
+            "default_format": resolve_stream_format(None),
+            "formats": ["text", *STREAM_FORMATS],
+            "event_flush_ms": EVENT_FLUSH_MS,
+            "event_flush_max_bytes": EVENT_FLUSH_MAX_BYTES,
         },
-        "stage2": {"ollama_url": OLLAMA_URL, "model": MODEL},
     }
 
 
 # =========================
 # ✅ STAGE 1 ONLY
 # =========================
+async def _with_stage1_timings(gen: AsyncIterator[bytes], meta: dict) -> AsyncIterator[bytes]:
+    try:
+        async for ch in gen:
+            yield ch
+    finally:
+        await gen.aclose()
+    tail = stage1_timings_line(meta)
+    if tail:
+        yield tail
+
+
 @app.post("/ask_llama")
 async def ask_llama(req: Request):
+    rt = start_request_timings(req, "/ask_llama")
     payload = await _read_payload(req)
+    parsed = resolve_session_prompt(payload)
     try:
         mode = resolve_mode(payload.route or "", "positivo")
-        gen, _buf = stream_and_collect_llama_api(payload, mode=mode)
-        return StreamingResponse(gen, media_type="text/plain; charset=utf-8", headers=STREAM_HEADERS)
+        rt.set(mode=mode, parse_ms=rt.since_ms())
+        rejected = admission_rejection("stage1", "interactive", rt) if stage1_calls_upstream(payload, mode, parsed) else None
+        if rejected is not None:
+            return rejected
+        meta: dict = {}
+        gen, _buf = stream_and_collect_llama_api(payload, mode=mode, parsed=parsed, meta=meta)
+        if payload.report_timings:
+            gen = _with_stage1_timings(gen, meta)
+        fmt = resolve_stream_format(payload.stream_format)
+        claim = preempt_claim(req, payload, rt)
+        gen, media_type = framed_stream(gen, rt, payload.report_timings or TIMING_TRAILER_DEFAULT, fmt, "stage1", claim)
+        return StreamingResponse(
+            guard_disconnect(req, gen, "/ask_llama"),
+            media_type=media_type,
+            headers={**STREAM_HEADERS, **rt.headers()},
+        )
     except Exception as e:
         return JSONResponse({"error": f"Stage1 HTTP call failed: {e}"}, status_code=500)
 
@@ -1216,12 +3711,14 @@ def _read_prompt_json(body: dict) -> str:
     if not prompt:
         return ""
     if len(prompt) > MAX_PROMPT_CHARS:
+        M_TRUNCATIONS.inc("max_prompt_chars")
         prompt = prompt[:MAX_PROMPT_CHARS]
     return prompt
 
 
 @app.post("/ask")
 async def ask(req: Request):
+    rt = start_request_timings(req, "/ask")
     try:
         body = await req.json()
     except Exception:
@@ -1230,40 +3727,141 @@ async def ask(req: Request):
     prompt = _read_prompt_json(body)
     if not prompt:
         return JSONResponse({"error": "missing prompt"}, status_code=400)
+    rt.set(parse_ms=rt.since_ms(), prompt_len=len(prompt))
+    trailer = bool((body or {}).get("report_timings")) or TIMING_TRAILER_DEFAULT
+    fmt = resolve_stream_format((body or {}).get("stream_format"))
 
     log.info("[/ask] prompt_len=%d preview=%r", len(prompt), prompt[:220])
 
+    cache_key = ""
+    if RESPONSE_CACHE_ENABLED:
+        cache_key = _digest("/ask", prompt, prompt_files_version(), json.dumps(OPTIONS_CORRECTOR, sort_keys=True))
+        if bool((body or {}).get("no_cache")):
+            RESPONSE_CACHE.bump("bypasses")
+        else:
+            cached = RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                log.info("[cache] hit /ask bytes=%d", len(cached))
+                rt.set(cache="HIT")
+                gen, media_type = framed_stream(_replay_cached(cached), rt, trailer, fmt, "stage2")
+                return StreamingResponse(
+                    gen,
+                    media_type=media_type,
+                    headers={**STREAM_HEADERS, "X-Cache": "HIT", **rt.headers()},
+                )
+
+    rejected = admission_rejection("stage2", "rewrite", rt)
+    if rejected is not None:
+        return rejected
+
+    gen = _bytes_stream(stream_ollama_chat(SYSTEM_PROMPT_CORRECTOR(), prompt, OPTIONS_CORRECTOR, sanitize_newlines=True, call="corrector"))
+    if cache_key:
+        gen = cache_fill(cache_key, gen, probe=req)
+    rt.set(cache="MISS" if cache_key else "OFF")
+    gen, media_type = framed_stream(gen, rt, trailer, fmt, "stage2")
+
     return StreamingResponse(
-        stream_ollama_chat(SYSTEM_PROMPT_CORRECTOR(), prompt, OPTIONS_CORRECTOR, sanitize_newlines=True),
-        media_type="text/plain; charset=utf-8",
-        headers=STREAM_HEADERS,
+        guard_disconnect(req, gen, "/ask"),
+        media_type=media_type,
+        headers={**STREAM_HEADERS, "X-Cache": "MISS" if cache_key else "OFF", **rt.headers()},
     )
 
 
 # =========================
-# ✅ CHAIN CORE
+# ✅ SESSIONS (delta transcript ingestion)
 # =========================
-def chain_stream(payload: AskRequest, background_tasks: BackgroundTasks, mode: str) -> Iterator[bytes]:
-    last = extract_last_valid(payload.prompt)
-    if last:
-        push_clean_message(last["author"], last["text"])
-    background_tasks.add_task(refresh_context_background)
+@app.post("/sessions/{session_id}/lines")
+async def session_append_lines(session_id: str, req: Request):
+    if not _SESSION_ID_RE.match(session_id or ""):
+        return JSONResponse({"error": "invalid session id"}, status_code=400)
+    try:
+        body = await req.json()
+    except Exception:
+        return JSONResponse({"error": "invalid json"}, status_code=400)
+    if not isinstance(body, dict):
+        return JSONResponse({"error": "JSON must be an object"}, status_code=400)
+
+    lines = body.get("lines")
+    if lines is None:
+        lines = [body.get("text") or ""]
+    if not isinstance(lines, list):
+        return JSONResponse({"error": "'lines' must be a list of strings"}, status_code=400)
+    bad = [i for i, x in enumerate(lines) if not isinstance(x, str)]
+    if bad:
+        # a dict/number would otherwise land in the transcript as its repr
+        return JSONResponse({"error": "'lines' items (or 'text') must be strings", "bad_items": bad[:20]}, status_code=422)
+
+    buf = get_transcript(session_id, create=True)
+    if body.get("reset"):
+        buf = TranscriptBuffer(session_id)
+        get_session(session_id).transcript = buf
+
+    # optional first_seq makes retries idempotent: lines the server already has are skipped.
+    # Seqs count split, non-empty lines (what append() stores), not request items.
+    first_seq = body.get("first_seq")
+    if first_seq is not None:
+        try:
+            first_seq = int(first_seq)
+        except Exception:
+            return JSONResponse({"error": "'first_seq' must be an integer"}, status_code=400)
+        if first_seq > buf.seq:
+            return JSONResponse({"error": "gap in line sequence", "seq": buf.seq}, status_code=409)
+        lines = _split_transcript_lines(lines)[buf.seq - first_seq:]
+
+    added = buf.append(lines)
+    return {"ok": True, "session_id": session_id, "added": added, **buf.snapshot()}
+
 
-    with STATE_LOCK:
-        ctx_now = CONTEXT_TEXT
+@app.delete("/sessions/{session_id}")
+def session_delete(session_id: str):
+    if not _SESSION_ID_RE.match(session_id or ""):
+        return JSONResponse({"error": "invalid session id"}, status_code=400)
+    existed = drop_session(session_id)
+    return {"ok": True, "session_id": session_id, "deleted": existed}
+
+
+# =========================
+# ✅ CHAIN CORE
+# =========================
+async def chain_stream(
+    payload: AskRequest,
+    mode: str,
+    request: Optional[Request] = None,
+    parsed: Optional[ParsedPrompt] = None,
+    ctx_now: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    # ctx_now: the caller already pushed the line / triggered consolidation (/ask_me_both)
+    pp = parsed or parse_prompt(payload.prompt)
+    if ctx_now is None:
+        session = get_session(payload.session_id)
+        if pp.found:
+            session.push(pp.author, pp.speech)
+        CONSOLIDATOR.trigger(session.session_id)
+        ctx_now = session.context()
+
+    if payload.overlap:
+        async for b in chain_stream_overlap(payload, mode, ctx_now, request=request, parsed=pp):
+            yield b
+        return
 
     # ---- Stage 1: stream + capture (HTTP)
     draft = ""
+    gen1 = None
     try:
-        gen1, buf = stream_and_collect_llama_api(payload, mode=mode)
+        meta1: dict = {}
+        gen1, buf = stream_and_collect_llama_api(payload, mode=mode, parsed=pp, meta=meta1)
         if payload.stream_stage1:
             yield b"[stage1]\n"
-            for ch in gen1:
+            async for ch in gen1:
                 yield ch
             yield b"\n[stage1_done]\n"
         else:
-            for _ in gen1:
+            async for _ in gen1:
                 pass
+        if payload.report_timings:
+            tail = stage1_timings_line(meta1)
+            if tail:
+                yield tail
 
         draft_raw = _to_str(bytes(buf))
         draft = _clean_stage1_text(draft_raw)
@@ -1274,11 +3872,27 @@ def chain_stream(payload: AskRequest, background_tasks: BackgroundTasks, mode: s
             yield b"[stage1_error] "
             yield _to_str(e).encode("utf-8", errors="ignore")
             yield b"\n"
+    finally:
+        if gen1 is not None:
+            await gen1.aclose()
+
+    # client left during stage1 -> don't spend 120b tokens on nobody
+    if request is not None and await request.is_disconnected():
+        _bump_cancel("skipped_stage2")
+        log.info("[chain] mode=%s client disconnected after stage1; skipping stage2", mode)
+        return
 
     # ---- Stage 2: stream 120b (starts only after stage1 finishes)
+    t_build = time.perf_counter()
     sys_prompt = get_stage2_profile_prompt(mode)
     options = OPTIONS_PROFILE_NEGATIVE if mode == "negativo" else OPTIONS_PROFILE_POSITIVE
-    user_text = build_profile_user_text(payload.prompt, draft=draft, context=ctx_now, mode=mode)
+    user_text = build_profile_user_text(payload.prompt, draft=draft, context=ctx_now, mode=mode, parsed=pp)
+    timing_set(
+        stage2_build_ms=round((time.perf_counter() - t_build) * 1000.0, 2),
+        prompt_len=len(payload.prompt or ""),
+        draft_len=len(draft or ""),
+        ctx_len=len(ctx_now or ""),
+    )
 
     log.info(
         "[chain] mode=%s prompt_len=%d draft_len=%d ctx_len=%d stream_stage1=%s",
@@ -1292,14 +3906,396 @@ def chain_stream(payload: AskRequest, background_tasks: BackgroundTasks, mode: s
     if payload.stream_stage1:
         yield b"\n[stage2]\n"
 
-    for chunk in stream_ollama_chat(sys_prompt, user_text, options, sanitize_newlines=False):
-        yield _to_str(chunk).encode("utf-8", errors="ignore")
+    async for b in _bytes_stream(stream_ollama_chat(sys_prompt, user_text, options, sanitize_newlines=False)):
+        yield b
+
+
+_SENTENCE_END_RE = re.compile(r"[.!?…](\s|$)")
+
+
+def _draft_good_enough(draft: str, n_deltas: int) -> bool:
+    if STAGE2_OVERLAP_MIN_TOKENS > 0 and n_deltas >= STAGE2_OVERLAP_MIN_TOKENS:
+        return True
+    if len(draft) >= STAGE2_OVERLAP_MIN_CHARS and _SENTENCE_END_RE.search(draft, STAGE2_OVERLAP_MIN_CHARS - 1):
+        return True
+    return False
+
+
+async def chain_stream_overlap(
+    payload: AskRequest,
+    mode: str,
+    ctx_now: str,
+    request: Optional[Request] = None,
+    parsed: Optional[ParsedPrompt] = None,
+) -> AsyncIterator[bytes]:
+    # Stage2 is dispatched as soon as the stage1 draft is good enough (first sentence / N deltas),
+    # or without a draft once STAGE2_OVERLAP_DEADLINE_MS passes. Stage1 keeps previewing until
+    # stage2 produces its first byte; stage2 bytes are queued so the markers stay ordered.
+    pp = parsed or parse_prompt(payload.prompt)
+    sys_prompt = get_stage2_profile_prompt(mode)
+    options = OPTIONS_PROFILE_NEGATIVE if mode == "negativo" else OPTIONS_PROFILE_POSITIVE
+
+    dispatch = {}
+    go = asyncio.Event()
+    first2 = asyncio.Event()
+    q2: asyncio.Queue = asyncio.Queue()
+    t0 = time.perf_counter()
+
+    def _dispatch(draft: str, reason: str):
+        if go.is_set():
+            return
+        dispatch.update(draft=draft, reason=reason, at_ms=(time.perf_counter() - t0) * 1000.0)
+        go.set()
+
+    async def _stage2():
+        try:
+            await go.wait()
+            if request is not None and await request.is_disconnected():
+                _bump_cancel("skipped_stage2")
+                return
+            t_build = time.perf_counter()
+            user_text = build_profile_user_text(payload.prompt, draft=dispatch["draft"], context=ctx_now, mode=mode, parsed=pp)
+            timing_set(
+                stage2_build_ms=round((time.perf_counter() - t_build) * 1000.0, 2),
+                prompt_len=len(payload.prompt or ""),
+                draft_len=len(dispatch["draft"] or ""),
+                ctx_len=len(ctx_now or ""),
+                overlap_reason=dispatch.get("reason"),
+                overlap_dispatch_ms=round(dispatch.get("at_ms", 0.0), 1),
+            )
+            async for b in _bytes_stream(stream_ollama_chat(sys_prompt, user_text, options, sanitize_newlines=False)):
+                first2.set()
+                await q2.put(b)
+        except Exception as e:
+            await q2.put(e)
+        finally:
+            q2.put_nowait(None)
+
+    loop = asyncio.get_running_loop()
+    timer = loop.call_later(max(STAGE2_OVERLAP_DEADLINE_MS, 0) / 1000.0, _dispatch, "", "deadline")
+    task2 = asyncio.create_task(_stage2())
+    first2_wait = asyncio.create_task(first2.wait())
+
+    gen1 = None
+    nxt = None
+    try:
+        # ---- Stage 1: stream + capture, racing against stage2's first byte
+        n_deltas = 0
+        preempted = False
+        meta1: dict = {}
+        try:
+            gen1, buf = stream_and_collect_llama_api(payload, mode=mode, parsed=pp, meta=meta1)
+            if payload.stream_stage1:
+                yield b"[stage1]\n"
+            it = gen1.__aiter__()
+            while True:
+                nxt = asyncio.ensure_future(it.__anext__())
+                done, _ = await asyncio.wait({nxt, first2_wait}, return_when=asyncio.FIRST_COMPLETED)
+                if nxt not in done:
+                    nxt.cancel()
+                    try:
+                        await nxt
+                    except BaseException:
+                        pass
+                    preempted = True
+                    break
+                try:
+                    ch = nxt.result()
+                except StopAsyncIteration:
+                    break
+                n_deltas += 1
+                if payload.stream_stage1:
+                    yield ch
+                if not go.is_set():
+                    d = _clean_stage1_text(_to_str(bytes(buf)))
+                    if _draft_good_enough(d, n_deltas):
+                        _dispatch(d, "early")
+            _dispatch(_clean_stage1_text(_to_str(bytes(buf))), "stage1_done")
+            if payload.stream_stage1:
+                yield b"\n[stage1_done]\n"
+            if payload.report_timings:
+                tail = stage1_timings_line(meta1)
+                if tail:
+                    yield tail
+        except Exception as e:
+            log.info("[chain] stage1_error=%s", e)
+            _dispatch("", "stage1_error")
+            if payload.stream_stage1:
+                yield b"[stage1_error] "
+                yield _to_str(e).encode("utf-8", errors="ignore")
+                yield b"\n"
+
+        log.info(
+            "[chain] mode=%s overlap=1 reason=%s dispatch_ms=%.0f prompt_len=%d draft_len=%d ctx_len=%d stage1_preempted=%s",
+            mode,
+            dispatch.get("reason"),
+            dispatch.get("at_ms", 0.0),
+            len(payload.prompt or ""),
+            len(dispatch.get("draft") or ""),
+            len(ctx_now or ""),
+            preempted,
+        )
+
+        # ---- Stage 2: drain what was queued while stage1 was previewing, then go live
+        if payload.stream_stage1:
+            yield b"\n[stage2]\n"
+        while True:
+            item = await q2.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        timer.cancel()
+        tasks = [t for t in (task2, first2_wait, nxt) if t is not None]
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        # reap them now: stage2's finally (admission release, upstream aclose, metrics) must run
+        # before this generator is gone, not whenever the loop gets to it
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.gather(*tasks, return_exceptions=True)), STAGE2_OVERLAP_REAP_S)
+        except asyncio.TimeoutError:
+            log.warning("[chain] overlap tasks still running %.1fs after cancel", STAGE2_OVERLAP_REAP_S)
+        finally:
+            if gen1 is not None:
+                await gen1.aclose()
+
+
+# =========================
+# 🗃️ Response cache (TTL + LRU)
+# =========================
+_CACHE_POISON_MARKERS = (b"[ollama_error]", b"[stage1_http_error]", b"[stage1_error]")
+
+
+class ResponseCache:
+    # key -> (expires_at, body); OrderedDict order == recency (last = most recent)
+    def __init__(self, max_entries: int, max_bytes: int, ttl_s: float):
+        self.max_entries = max(int(max_entries), 0)
+        self.max_bytes = max(int(max_bytes), 0)
+        self.ttl_s = float(ttl_s)
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "bypasses": 0}
+
+    def _drop(self, key: str):
+        _exp, body = self._data.pop(key)
+        self._bytes -= len(body)
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            if item[0] <= now:
+                self._drop(key)
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return item[1]
+
+    def put(self, key: str, body: bytes):
+        if self.max_entries <= 0 or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl_s, body)
+            self._bytes += len(body)
+            self.stats["stores"] += 1
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+
+    def peek(self, key: str) -> bool:
+        # fresh entry present? (no stats, no recency bump)
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and item[0] > time.monotonic()
+
+    def bump(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                **self.stats,
+            }
+
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_S)
+DRAFT_CACHE = ResponseCache(DRAFT_CACHE_MAX_ENTRIES, DRAFT_CACHE_MAX_BYTES, DRAFT_CACHE_TTL_S)
+
+
+def _digest(*parts) -> str:
+    raw = "\x1f".join(_to_str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+
+# per-call llama.cpp prefill stats: true for the request that made the call, not for a replay
+_STAGE1_TIMINGS_LINE_RE = re.compile(rb"\n\[stage1_timings\] [^\n]*\n")
+
+
+async def cache_fill(key: str, gen: AsyncIterator[bytes], probe=None) -> AsyncIterator[bytes]:
+    # passthrough that stores the full body only if the stream completed cleanly
+    # (probe: anything with is_disconnected(); a chain that skipped stage2 for a gone client is partial)
+    parts = []
+    try:
+        async for b in gen:
+            parts.append(b)
+            yield b
+    finally:
+        await gen.aclose()
+    if probe is not None and await probe.is_disconnected():
+        return
+    body = _STAGE1_TIMINGS_LINE_RE.sub(b"", b"".join(parts))
+    if body and not any(m in body for m in _CACHE_POISON_MARKERS):
+        RESPONSE_CACHE.put(key, body)
+
+
+async def _replay_cached(body: bytes) -> AsyncIterator[bytes]:
+    yield body
+
+
+# =========================
+# 🔁 Single-flight (coalesce identical in-flight chains)
+# =========================
+def _norm_speech(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def coalesce_key(endpoint: str, mode: str, payload: AskRequest, *extra: str, parsed: Optional[ParsedPrompt] = None) -> str:
+    pp = parsed or parse_prompt(payload.prompt)
+    author, speech = (pp.author, pp.speech) if pp.found else ("", payload.prompt)
+    parts = [
+        endpoint,
+        mode,
+        _norm_speech(author),
+        _norm_speech(speech),
+        prompt_files_version(),
+        # output-shaping knobs: a replay must be byte-compatible with what this caller asked for
+        f"s1={int(bool(payload.stream_stage1))}",
+        f"ov={int(bool(payload.overlap))}",
+        f"rt={int(bool(payload.report_timings))}",
+        f"np={_effective_stage1_n_predict(payload)}",
+        f"t={payload.temperature}",
+        f"p={payload.top_p}",
+        f"u={payload.url or ''}",
+        *extra,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8", errors="ignore")).hexdigest()
+
+
+def chain_cache_key(endpoint: str, mode: str, payload: AskRequest, parsed: Optional[ParsedPrompt] = None) -> str:
+    # response-cache key: coalesce key + the session's consolidated context + stage-2 options
+    pp = parsed or parse_prompt(payload.prompt)
+    session = get_session(payload.session_id)
+    ctx_hash = session.context_digest_for(pp.author, pp.speech) if pp.found else _digest(session.context())
+    options = OPTIONS_PROFILE_NEGATIVE if mode == "negativo" else OPTIONS_PROFILE_POSITIVE
+    return coalesce_key(endpoint, mode, payload, f"ctx={ctx_hash}", f"o2={_digest(json.dumps(options, sort_keys=True))}", parsed=pp)
+
+
+class _Flight:
+    # One upstream generation; subscribers replay chunks[0:] and then follow live bytes.
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _publish(self):
+        ev = self._changed
+        self._changed = asyncio.Event()
+        ev.set()
+
+    async def is_disconnected(self) -> bool:
+        # duck-types Request.is_disconnected for chain_stream: "gone" once every subscriber left
+        return self.cancelled or self.subscribers <= 0
+
+    async def _run(self, gen: AsyncIterator[bytes]):
+        try:
+            async for b in gen:
+                self.chunks.append(b)
+                self._publish()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("coalesced stream cancelled")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            if _FLIGHTS.get(self.key) is self:
+                _FLIGHTS.pop(self.key, None)
+            try:
+                await gen.aclose()
+            finally:
+                self._publish()
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        # the subscriber slot was taken in single_flight(), so a fast stage1 can't see "nobody listening"
+        i = 0
+        try:
+            while True:
+                while i < len(self.chunks):
+                    yield self.chunks[i]
+                    i += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers <= 0 and not self.done and self.task is not None:
+                self.cancelled = True
+                self.task.cancel()
+
+
+_FLIGHTS = {}  # key -> _Flight
+COALESCE_STATS = {"leaders": 0, "followers": 0}
+
+
+def flight_in_progress(key: str) -> bool:
+    f = _FLIGHTS.get(key) if key else None
+    return f is not None and not f.done and not f.cancelled
+
+
+def single_flight(key: str, make_gen) -> Tuple[_Flight, bool]:
+    # make_gen(probe) -> AsyncIterator[bytes]; probe.is_disconnected() is True once nobody listens
+    f = _FLIGHTS.get(key)
+    if f is not None and not f.done and not f.cancelled:
+        f.subscribers += 1
+        COALESCE_STATS["followers"] += 1
+        return f, False
+    f = _Flight(key)
+    f.subscribers = 1
+    _FLIGHTS[key] = f
+    f.task = asyncio.create_task(f._run(make_gen(f)))
+    COALESCE_STATS["leaders"] += 1
+    return f, True
 
 
 # =========================
 # ✅ CHAIN ENDPOINTS
 # =========================
-async def _ask_me_core(req: Request, background_tasks: BackgroundTasks, mode: str):
+async def _ask_me_core(req: Request, mode: str):
+    rt = start_request_timings(req, req.url.path)
     payload = await _read_payload(req)
     try:
         body = await req.json()
@@ -1307,21 +4303,185 @@ async def _ask_me_core(req: Request, background_tasks: BackgroundTasks, mode: st
         body = {}
     route = str((body or {}).get("route", "")).strip().lower()
     mode = resolve_mode(route, mode)
+    parsed = resolve_session_prompt(payload) or parse_prompt(payload.prompt)
+    session = get_session(payload.session_id)
+    rt.set(mode=mode, parse_ms=rt.since_ms(), session_id=session.session_id)
+    trailer = payload.report_timings or TIMING_TRAILER_DEFAULT
+    fmt = resolve_stream_format(payload.stream_format)
+    # without stream_stage1 the body is stage-2 text only (no markers)
+    first_stage = "stage1" if payload.stream_stage1 else "stage2"
+
+    cache_key = ""
+    if RESPONSE_CACHE_ENABLED:
+        cache_key = chain_cache_key(req.url.path, mode, payload, parsed)
+        if payload.no_cache:
+            RESPONSE_CACHE.bump("bypasses")
+        else:
+            cached = RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                log.info("[cache] hit %s mode=%s bytes=%d", req.url.path, mode, len(cached))
+                # the line still happened in this meeting: keep the session's conversation in sync
+                if parsed.found:
+                    session.push(parsed.author, parsed.speech)
+                CONSOLIDATOR.trigger(session.session_id)
+                rt.set(cache="HIT")
+                claim = preempt_claim(req, payload, rt)
+                gen, media_type = framed_stream(_replay_cached(cached), rt, trailer, fmt, first_stage, claim)
+                return StreamingResponse(
+                    gen,
+                    media_type=media_type,
+                    headers={**STREAM_HEADERS, "X-Cache": "HIT", **rt.headers()},
+                )
+
+    def _make_chain(probe):
+        gen = chain_stream(payload, mode=mode, request=probe, parsed=parsed)
+        return cache_fill(cache_key, gen, probe=probe) if cache_key else gen
+
+    # per session: a follower must not get an answer built on another meeting's context
+    key = coalesce_key(req.url.path, mode, payload, f"sid={session.session_id}", parsed=parsed) if COALESCE_ENABLED else ""
+    if not flight_in_progress(key):
+        rejected = chain_admission_rejection(payload, (mode,), parsed, rt)
+        if rejected is not None:
+            return rejected
+
+    if COALESCE_ENABLED:
+        flight, leader = single_flight(key, _make_chain)
+        if not leader:
+            # same session (sid is in the key): the leader's chain_stream already pushed this line
+            log.info("[coalesce] %s mode=%s attached to in-flight key=%s replay_chunks=%d", req.url.path, mode, key[:12], len(flight.chunks))
+        rt.set(coalesced=not leader)
+        gen = flight.subscribe()
+    else:
+        gen = _make_chain(req)
+    rt.set(cache="MISS" if cache_key else "OFF")
+    gen, media_type = framed_stream(gen, rt, trailer, fmt, first_stage, preempt_claim(req, payload, rt))
+
     return StreamingResponse(
-        chain_stream(payload, background_tasks, mode=mode),
-        media_type="text/plain; charset=utf-8",
-        headers=STREAM_HEADERS,
+        guard_disconnect(req, gen, f"chain:{mode}"),
+        media_type=media_type,
+        headers={**STREAM_HEADERS, "X-Cache": "MISS" if cache_key else "OFF", **rt.headers()},
     )
 
 
 @app.post("/ask_me")
-async def ask_me(req: Request, background_tasks: BackgroundTasks):
-    return await _ask_me_core(req, background_tasks, mode="positivo")
+async def ask_me(req: Request):
+    return await _ask_me_core(req, mode="positivo")
 
 
 @app.post("/ask_me_neg")
-async def ask_me_neg(req: Request, background_tasks: BackgroundTasks):
-    return await _ask_me_core(req, background_tasks, mode="negativo")
+async def ask_me_neg(req: Request):
+    return await _ask_me_core(req, mode="negativo")
+
+
+# =========================
+# ✅ BOTH MOODS (one request -> positive + negative, multiplexed events)
+# =========================
+BOTH_MODES = (("positivo", "/ask_me"), ("negativo", "/ask_me_neg"))
+
+
+async def _multiplex_modes(streams: dict, fmt: str, rt: RequestTimings, trailer: bool) -> AsyncIterator[bytes]:
+    # streams: mode -> (event generator, per-mode RequestTimings). Each pump runs in its own task
+    # with its own timings in the ContextVar, so the two chains don't overwrite each other's
+    # stage fields; whole events are interleaved in arrival order.
+    q: asyncio.Queue = asyncio.Queue()
+
+    async def _pump(mode: str, gen: AsyncIterator[bytes], child: RequestTimings):
+        _REQ_TIMINGS.set(child)
+        try:
+            async for b in gen:
+                await q.put(b)
+        except Exception as e:
+            log.info("[both] mode=%s failed: %s", mode, e)
+            await q.put(_encode_event({"type": "error", "mode": mode, "stage": "stage2", "message": _to_str(e)}, fmt))
+        finally:
+            await gen.aclose()
+            q.put_nowait(None)
+
+    tasks = [asyncio.create_task(_pump(m, g, c)) for m, (g, c) in streams.items()]
+    live = len(tasks)
+    try:
+        while live:
+            item = await q.get()
+            if item is None:
+                live -= 1
+                continue
+            yield item
+        rt.set(modes={m: {k: v for k, v in c.record().items() if k not in ("request_id", "endpoint")} for m, (_g, c) in streams.items()})
+        if trailer:
+            yield _encode_event({"type": "timings", "scope": "request", "data": {**rt.record(), "total_ms": rt.since_ms()}}, fmt)
+        yield _encode_event({"type": "done", "modes": list(streams), "request_id": rt.request_id}, fmt)
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except BaseException:
+                pass
+
+
+@app.post("/ask_me_both")
+async def ask_me_both(req: Request):
+    # One parse, one session push and one consolidation trigger; both chains run concurrently on
+    # the same context and stream back as one NDJSON/SSE event stream, every event tagged "mode".
+    # Per-mode replies share the /ask_me and /ask_me_neg response-cache entries.
+    rt = start_request_timings(req, "/ask_me_both")
+    payload = await _read_payload(req)
+    parsed = resolve_session_prompt(payload) or parse_prompt(payload.prompt)
+    session = get_session(payload.session_id)
+    rt.set(parse_ms=rt.since_ms(), session_id=session.session_id)
+    fmt = resolve_stream_format(payload.stream_format)
+    if fmt not in STREAM_FORMATS:
+        fmt = "ndjson"  # two interleaved replies need framing
+    first_stage = "stage1" if payload.stream_stage1 else "stage2"
+
+    keys = {}
+    if RESPONSE_CACHE_ENABLED:
+        # same keys as the single-mode endpoints (context as it will be once this line is pushed)
+        keys = {mode: chain_cache_key(path, mode, payload, parsed) for mode, path in BOTH_MODES}
+    cached = {}
+    for mode, key in keys.items():
+        if payload.no_cache:
+            RESPONSE_CACHE.bump("bypasses")
+            continue
+        body = RESPONSE_CACHE.get(key)
+        if body is not None:
+            cached[mode] = body
+    if len(cached) < len(BOTH_MODES):
+        rejected = chain_admission_rejection(payload, [m for m, _p in BOTH_MODES if m not in cached], parsed, rt)
+        if rejected is not None:
+            return rejected
+
+    if parsed.found:
+        session.push(parsed.author, parsed.speech)
+    CONSOLIDATOR.trigger(session.session_id)
+    ctx_now = session.context()
+
+    streams = {}
+    for mode, _path in BOTH_MODES:
+        child = RequestTimings(f"/ask_me_both:{mode}", rt.request_id)
+        if mode in cached:
+            gen = _replay_cached(cached[mode])
+            child.set(cache="HIT")
+        else:
+            gen = chain_stream(payload, mode=mode, request=req, parsed=parsed, ctx_now=ctx_now)
+            if mode in keys:
+                gen = cache_fill(keys[mode], gen, probe=req)
+            child.set(cache="MISS" if mode in keys else "OFF")
+        streams[mode] = (event_stream(gen, fmt, first_stage, child, tags={"mode": mode}), child)
+    rt.set(cache=",".join(f"{m}={c.fields['cache']}" for m, (_g, c) in streams.items()))
+    log.info("[both] session=%s prompt_len=%d cache=%s", session.session_id, len(payload.prompt or ""), rt.fields["cache"])
+
+    gen = _multiplex_modes(streams, fmt, rt, payload.report_timings or TIMING_TRAILER_DEFAULT)
+    claim = preempt_claim(req, payload, rt)
+    if claim is not None:
+        gen = preemptible(gen, claim, marker=lambda by: _encode_event({"type": "preempted", "by": by}, fmt))
+    return StreamingResponse(
+        guard_disconnect(req, timed_stream(gen, rt, False), "/ask_me_both"),
+        media_type=STREAM_FORMATS[fmt],
+        headers={**STREAM_HEADERS, **rt.headers()},
+    )
 
 
 # =========================
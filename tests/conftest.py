@@ -0,0 +1,22 @@
+# tests/conftest.py — import server.py with upstreams pointed at a closed port
+#
+# server.py reads its config at import time, so the environment is set before the first import.
+# Port 9 (discard) refuses connections on a normal host: every upstream call fails fast.
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEAD = "http://127.0.0.1:9"
+
+os.environ.update(
+    LLAMA_URL=f"{DEAD}/completion",
+    LLAMA_URLS="",
+    OLLAMA_URL=f"{DEAD}/api/chat",
+    WARMUP_ENABLED="0",
+    ADMISSION_ENABLED="1",
+    STAGE2_HEDGE_AFTER_MS="0",
+    OLLAMA_CONNECT_TIMEOUT="2",
+    STAGE1_CONNECT_TIMEOUT="2",
+)
+sys.path.insert(0, ROOT_DIR)
@@ -0,0 +1,83 @@
+# tests/test_endpoints.py — HTTP behaviour with every upstream down, plus session ingestion
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as c:
+        yield c
+
+
+def _events(r) -> list:
+    return [json.loads(ln) for ln in r.text.splitlines() if ln.strip()]
+
+
+# ---- stage 2 down
+
+
+def test_ask_ndjson_reports_stage2_down_as_an_error_event(client):
+    r = client.post("/ask", json={"prompt": "fix this please", "stream_format": "ndjson"})
+    assert r.status_code == 200
+    evs = _events(r)
+    assert evs[0]["type"] == "start"
+    errs = [e for e in evs if e["type"] == "error"]
+    assert len(errs) == 1 and errs[0]["stage"] == "stage2" and errs[0]["message"]
+    assert evs[-1]["type"] == "final" and evs[-1]["text"] == ""
+
+
+def test_ask_text_keeps_the_error_marker_and_is_not_cached(client):
+    for _ in range(2):
+        r = client.post("/ask", json={"prompt": "another sentence to fix"})
+        assert r.status_code == 200
+        assert r.text.startswith("[ollama_error] ")
+        assert r.headers["x-cache"] == "MISS"
+
+
+def test_ask_me_both_stages_down(client):
+    r = client.post("/ask_me", json={"prompt": "hello there", "stream_format": "ndjson"})
+    assert r.status_code == 200
+    evs = _events(r)
+    assert [e["stage"] for e in evs if e["type"] == "error"] == ["stage1", "stage2"]
+    types = [e["type"] for e in evs]
+    assert types.count("stage_done") == 2
+    assert types[-1] == "final"
+
+
+def test_ask_me_text_stage2_error_follows_the_stage2_marker(client):
+    r = client.post("/ask_me", json={"prompt": "hello again"})
+    assert r.status_code == 200
+    assert "[stage2]\n[ollama_error] " in r.text
+
+
+# ---- sessions
+
+
+def test_session_lines_first_seq_makes_retries_idempotent(client):
+    sid = "meet-idem:1"
+    client.delete(f"/sessions/{sid}")
+    r1 = client.post(f"/sessions/{sid}/lines", json={"lines": ["a: hi", "b: hello"], "first_seq": 0})
+    r2 = client.post(f"/sessions/{sid}/lines", json={"lines": ["b: hello", "a: how are you"], "first_seq": 1})
+    assert r1.json()["added"] == 2
+    assert r2.json()["added"] == 1
+    gap = client.post(f"/sessions/{sid}/lines", json={"lines": ["x"], "first_seq": 9})
+    assert gap.status_code == 409 and gap.json()["seq"] == 3
+    assert client.delete(f"/sessions/{sid}").json()["deleted"] is True
+
+
+def test_session_lines_reject_non_string_items(client):
+    r = client.post("/sessions/meet-bad/lines", json={"lines": ["ok", {"text": "no"}, 3]})
+    assert r.status_code == 422
+    assert r.json()["bad_items"] == [1, 2]
+
+
+@pytest.mark.parametrize("sid", ["has space", "x" * 129])
+def test_invalid_session_id_is_refused(client, sid):
+    assert client.post(f"/sessions/{sid}/lines", json={"lines": ["a"]}).status_code == 400
+    assert client.delete(f"/sessions/{sid}").status_code == 400
+    assert client.post("/ask_me", json={"prompt": "hi", "session_id": sid}).status_code == 400
@@ -0,0 +1,240 @@
+# tests/test_flow_control.py — single-flight coalescing, admission control and preemption
+
+import asyncio
+
+import pytest
+
+import server
+
+
+async def _collect(gen) -> bytes:
+    return b"".join([b async for b in gen])
+
+
+# ---- single_flight
+
+
+def test_single_flight_replays_to_a_late_follower():
+    calls = []
+    step = asyncio.Event
+
+    async def run():
+        gate = step()
+
+        async def upstream(_probe):
+            calls.append(1)
+            yield b"one "
+            await gate.wait()
+            yield b"two "
+            yield b"three"
+
+        f1, leader = server.single_flight("k-replay", upstream)
+        sub1 = asyncio.ensure_future(_collect(f1.subscribe()))
+        while not f1.chunks:
+            await asyncio.sleep(0)
+        # joins after "one " went out: gets it replayed, then follows live
+        f2, leader2 = server.single_flight("k-replay", upstream)
+        assert f2 is f1 and leader and not leader2
+        assert server.flight_in_progress("k-replay")
+        sub2 = asyncio.ensure_future(_collect(f2.subscribe()))
+        gate.set()
+        return await sub1, await sub2
+
+    a, b = asyncio.run(run())
+    assert a == b == b"one two three"
+    assert calls == [1]
+    assert not server.flight_in_progress("k-replay")
+
+
+def test_single_flight_cancels_upstream_when_everyone_leaves():
+    closed = []
+
+    async def run():
+        async def upstream(_probe):
+            try:
+                yield b"x"
+                await asyncio.sleep(60)
+                yield b"never"
+            finally:
+                closed.append(1)
+
+        f, _leader = server.single_flight("k-leave", upstream)
+        sub = f.subscribe()
+        assert await sub.__anext__() == b"x"
+        await sub.aclose()
+        try:
+            await f.task
+        except BaseException:
+            pass
+        return f
+
+    f = asyncio.run(run())
+    assert f.cancelled and f.done
+    assert closed == [1]
+
+
+def test_single_flight_error_reaches_every_subscriber():
+    async def run():
+        async def upstream(_probe):
+            yield b"partial"
+            raise RuntimeError("boom")
+
+        f1, _ = server.single_flight("k-err", upstream)
+        f2, _ = server.single_flight("k-err", upstream)
+        results = await asyncio.gather(_collect(f1.subscribe()), _collect(f2.subscribe()), return_exceptions=True)
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) and str(r) == "boom" for r in results)
+
+
+# ---- AdmissionGate
+
+
+def test_admission_queue_full_is_429():
+    async def run():
+        gate = server.AdmissionGate("t", limit=1, queue_max=0)
+        t = await gate.acquire("interactive")
+        rejected = gate.check("interactive")
+        with pytest.raises(server.AdmissionRejected) as ei:
+            await gate.acquire("interactive")
+        gate.release(t)
+        return gate, rejected, ei.value
+
+    gate, rejected, raised = asyncio.run(run())
+    assert rejected.status == 429 and rejected.reason == "queue_full"
+    assert raised.status == 429
+    assert gate.in_use == 0 and gate.stats["shed_queue_full"] == 1
+
+
+def test_admission_predicted_wait_over_deadline_is_503():
+    gate = server.AdmissionGate("t", limit=1, queue_max=8)
+    gate.in_use = 1
+    gate.ewma_hold_s = server.ADMISSION_WAIT_MS["interactive"] / 1000.0 * 2
+    e = gate.check("interactive")
+    assert e.status == 503 and e.reason == "deadline"
+    assert e.retry_after_s >= 1.0
+    # background work tolerates a much longer wait
+    assert gate.check("background") is None
+
+
+def test_admission_hands_slot_to_best_waiter():
+    async def run():
+        gate = server.AdmissionGate("t", limit=1, queue_max=8)
+        order = []
+        first = await gate.acquire("interactive")
+
+        async def waiter(prio):
+            t = await gate.acquire(prio)
+            order.append(prio)
+            gate.release(t)
+
+        tasks = [asyncio.ensure_future(waiter("background")), asyncio.ensure_future(waiter("interactive"))]
+        await asyncio.sleep(0.01)
+        assert gate.depth() == 2
+        gate.release(first)
+        await asyncio.gather(*tasks)
+        return gate, order
+
+    gate, order = asyncio.run(run())
+    assert order == ["interactive", "background"]
+    assert gate.in_use == 0 and gate.depth() == 0
+
+
+def test_admission_queue_timeout_is_503(monkeypatch):
+    monkeypatch.setitem(server.ADMISSION_WAIT_MS, "interactive", 20)
+
+    async def run():
+        gate = server.AdmissionGate("t", limit=1, queue_max=8)
+        t = await gate.acquire("interactive")
+        with pytest.raises(server.AdmissionRejected) as ei:
+            await gate.acquire("interactive")
+        gate.release(t)
+        return gate, ei.value
+
+    gate, e = asyncio.run(run())
+    assert e.status == 503 and e.reason == "timeout"
+    assert gate.in_use == 0 and gate.depth() == 0
+
+
+def test_admission_try_acquire_never_queues():
+    async def run():
+        gate = server.AdmissionGate("t", limit=1, queue_max=8)
+        ok1, t1 = gate.try_acquire("interactive")
+        ok2, t2 = gate.try_acquire("interactive")
+        gate.release(t1)
+        return gate, ok1, ok2, t2
+
+    gate, ok1, ok2, t2 = asyncio.run(run())
+    assert ok1 and not ok2 and t2 is None
+    assert gate.in_use == 0 and gate.depth() == 0
+
+
+# ---- preemption
+
+
+def test_newer_claim_preempts_the_older_one():
+    async def run():
+        reg = server.PreemptionRegistry()
+        old_rt, new_rt = server.RequestTimings("/ask_me", "aaaa1111"), server.RequestTimings("/ask_me", "bbbb2222")
+        old = reg.claim("/ask_me", "meetA", old_rt)
+        other = reg.claim("/ask_me", "meetB", server.RequestTimings("/ask_me"))
+        new = reg.claim("/ask_me", "meetA", new_rt)
+        return reg, old, other, new, old_rt
+
+    reg, old, other, new, old_rt = asyncio.run(run())
+    assert old.event.is_set() and old.by == "bbbb2222"
+    assert old_rt.fields["preempted_by"] == "bbbb2222"
+    assert not other.event.is_set() and not new.event.is_set()
+    reg.release(old)  # a stale release must not drop the newer claim
+    assert reg.snapshot()["active_keys"] == 2
+
+
+def test_preemptible_stops_the_stream_and_closes_upstream():
+    closed = []
+
+    async def run():
+        reg = server.PreemptionRegistry()
+        claim = reg.claim("/ask_me", "meetA", server.RequestTimings("/ask_me"))
+
+        async def upstream():
+            try:
+                yield b"first "
+                await asyncio.sleep(60)
+                yield b"never"
+            finally:
+                closed.append(1)
+
+        out = []
+
+        async def consume():
+            async for b in server.preemptible(upstream(), claim):
+                out.append(b)
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        reg.claim("/ask_me", "meetA", server.RequestTimings("/ask_me", "cccc3333"))
+        await asyncio.wait_for(task, 5)
+        return b"".join(out)
+
+    body = asyncio.run(run())
+    assert body == b"first \n[preempted] cccc3333\n"
+    assert closed == [1]
+
+
+def test_preempt_needs_an_explicit_key_or_session():
+    class _Req:
+        class url:
+            path = "/ask_me"
+
+    rt = server.RequestTimings("/ask_me")
+    anon = server.AskRequest(prompt="x", preempt=True)
+    keyed = server.AskRequest(prompt="x", preempt=True, session_id="meetZ")
+
+    async def run():
+        return server.preempt_claim(_Req, anon, rt), server.preempt_claim(_Req, keyed, rt)
+
+    a, k = asyncio.run(run())
+    assert a is None
+    assert k is not None and k.key == "/ask_me|meetZ"
+    server.PREEMPTION.release(k)